@@ -2,11 +2,15 @@
 # Licensed under the MIT License. See LICENSE file for details.
 
 import argparse
+import threading
+from functools import lru_cache, partial
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import importlib.resources
 import tomllib
 from .log import setup_logging
 from .config import load_config, check_parameters
+from .download import wait_download
 from .runner import download_workflow_tarball, setup_rundir, run_test, run_pytest
 
 
@@ -41,12 +45,21 @@ def print_keywords(keywords):
         print(keyword)
 
 
-def set_cl_args(config):
+# Fallbacks for command-line flags not set by the config file or the command line.
+CLI_DEFAULTS = {
+    'init': False,
+    'verbose': False,
+    'donly': False,
+    'nochecksum': False,
+    'label': "",
+}
+
+
+@lru_cache(maxsize=1)
+def build_parser():
     """
-    Collects command line arguments and overrides parameters.
+    Build the yambo-tester argument parser once per interpreter.
     """
-    config.setdefault('executables', {})
-    # Parsing command line
     parser = argparse.ArgumentParser(prog='yambo-tester',
                                      description='A Python-based testing framework for validating Yambo simulations using the official Yambo test suite.',
                                      epilog="Copyright (c) 2025 Nicola Spallanzani")
@@ -82,6 +95,8 @@ def set_cl_args(config):
                         help='Number of MPI tasks', type=int, dest='nprocs')
     parser.add_argument('--thrs',
                         help='Number of OpenMP threads per task', type=int, dest='thrs')
+    parser.add_argument('-j', '--jobs',
+                        help='Number of workflows executed concurrently', type=int, dest='jobs')
     parser.add_argument('--runlevel',
                         help='Run only workflow steps matching this runlevel and their dependencies. May be repeated.',
                         type=str, action='append', dest='runlevels')
@@ -99,7 +114,15 @@ def set_cl_args(config):
                         type=parse_executable_override,
                         action='append',
                         dest='executables')
-    args = parser.parse_args()
+    return parser
+
+
+def set_cl_args(config):
+    """
+    Collects command line arguments and overrides parameters.
+    """
+    config.setdefault('executables', {})
+    args = build_parser().parse_args()
 
     for arg, val in args.__dict__.items():
         if arg == 'executables':
@@ -112,15 +135,42 @@ def set_cl_args(config):
         config.setdefault('executables', {})
         for key, executable in args.executables:
             config['executables'][key] = executable
-    if not 'init' in config['parameters']: config['parameters']['init'] = False
-    if not 'verbose' in config['parameters']: config['parameters']['verbose'] = False
-    if not 'donly' in config['parameters']: config['parameters']['donly'] = False
-    if not 'nochecksum' in config['parameters']: config['parameters']['nochecksum'] = False
-    if not 'label' in config['parameters']: config['parameters']['label'] = ""
+    config['parameters'] = CLI_DEFAULTS | config['parameters']
 
     return config
 
 
+def execute_workflow(test, parameters, logger, stop=None):
+    """
+    Prepare the run directory of one workflow and run all its steps.
+    """
+    logger.info(f"[{test['name']}/{test['type']}] Starting test")
+    test['test_dir'], test['run_dir'] = setup_rundir(test, parameters, logger)
+    return run_test(test, parameters, logger, verbose=parameters['verbose'], stop=stop)
+
+
+def validate_workflow(test, local_logger, parameters, logger, isolated=False, stop=None):
+    """
+    Check the results of one executed workflow with pytest.
+    """
+    run_pytest(test, local_logger, verbose=parameters['verbose'], isolated=isolated, stop=stop)
+    logger.info(f"[{test['name']}/{test['type']}] Finished test")
+
+
+def run_workflow(test, parameters, logger, isolated=False, stop=None):
+    """
+    Run one workflow and check its results.
+
+    Once the stop event is set, the running step is terminated and neither
+    the following steps nor the validation are started.
+    """
+    local_logger = execute_workflow(test, parameters, logger, stop)
+    if stop is not None and stop.is_set():
+        logger.warning(f"[{test['name']}/{test['type']}] Interrupted")
+        return
+    validate_workflow(test, local_logger, parameters, logger, isolated, stop)
+
+
 def main():
     """
     Main function for the command line executable.
@@ -138,29 +188,45 @@ def main():
     logger = setup_logging(Path(config['parameters']['logger']))
     if not config['parameters']['init']: logger.info(f"Using {config['config']}")
     parameters = check_parameters(config['parameters'], config['executables'], logger)
+    tests = [
+        {'name': test_name, 'type': test_type}
+        for test_name, test_types in config['tests'].items()
+        for test_type in test_types
+    ]
 
     if parameters['donly']:
-        for test_name, test_types in config['tests'].items():
-            for test_type in test_types:
-                test = {'name': test_name, 'type': test_type}
-                tar_file, process = download_workflow_tarball(test, parameters, logger)
-                if process is not None:
-                    retcode = process.wait()
-                    if retcode != 0:
-                        raise RuntimeError(f"Download of tarball {tar_file} failed.")
+        # All missing tarballs are scheduled first and fetched concurrently.
+        downloads = [download_workflow_tarball(test, parameters, logger) for test in tests]
+        for tar_file, download in downloads:
+            wait_download(tar_file, download)
     elif parameters['init']:
         pass
     else:
         # Running the tests
-        for test_name, test_types in config['tests'].items():
-            for test_type in test_types:
-                test = {'name': test_name, 'type': test_type}
-                logger.info(f"[{test_name}/{test_type}] Starting test")
-                test['test_dir'], test['run_dir']  = setup_rundir(test, parameters, logger)
-                local_logger = run_test(test, parameters, logger, verbose=parameters['verbose'])
-                run_pytest(test, local_logger, verbose=parameters['verbose'])
-                logger.info(f"[{test_name}/{test_type}] Finished test")
-
+        jobs = parameters.get('jobs', 1)
+        if jobs > 1:
+            # Workflows are independent and dominated by external processes, so they
+            # run in a thread pool. pytest.main() is not thread-safe, so each workflow
+            # is validated by pytest in its own interpreter as soon as it has run.
+            # On errors and Ctrl-C the pending workflows are cancelled and the
+            # running ones are stopped: their current step is terminated and no
+            # further step or validation is launched. Worker threads are joined
+            # at exit, so without the stop event they would run to completion.
+            stop = threading.Event()
+            executor = ThreadPoolExecutor(max_workers=jobs)
+            try:
+                list(executor.map(
+                    partial(run_workflow, parameters=parameters, logger=logger, isolated=True, stop=stop),
+                    tests,
+                ))
+            except BaseException:
+                stop.set()
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+            executor.shutdown()
+        else:
+            for test in tests:
+                run_workflow(test, parameters, logger)
 
 if __name__ == '__main__':
     main()
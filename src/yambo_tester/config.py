@@ -1,26 +1,32 @@
 # Copyright (c) 2025 Nicola Spallanzani
 # Licensed under the MIT License. See LICENSE file for details.
 
+import os
+import json
+import stat
 import shutil
 import string
 import tomllib
 import argparse
+import tempfile
 import subprocess
 from pathlib import Path
 import importlib.resources
 from datetime import datetime
+from functools import lru_cache
 from .versioning import resolve_yambo_version
 
 # Default parameters
 PARAMETERS = {
     'label': "cirun",
     'yambo_bin': "",
-    'tests_dir': importlib.resources.files("yambo_tester") / "tests",
+    'tests_dir': None,  # resolved by default_tests_dir() when needed
     'scratch_dir': "scratch",
     'cache_dir': "cache",
     'mpi_launcher': "mpirun",
     'nprocs': 2,
     'thrs': 1,
+    'jobs': 1,
     'tollerance': 0.1,
     'runlevels': [],
     'download_link': "",
@@ -33,6 +39,11 @@ REQUIRED_EXECUTABLES = {
     'a2y': 'a2y',
 }
 
+YAMBO_INFO_CACHE = "yambo_info.json"
+
+# Directories created by check_parameters when they are missing.
+AUTO_CREATED_DIRS = ('scratch_dir', 'cache_dir')
+
 LEGACY_PARAMETER_EXECUTABLES = {
     'yambo',
     'p2y',
@@ -49,6 +60,32 @@ LEGACY_PARAMETER_EXECUTABLES = {
 }
 
 
+# Numeric parameters checked by check_parameters:
+# (name, whether it is used, check on its value, error message)
+NUMERIC_CHECKS = (
+    ('nprocs', lambda p: p['mpi'] and p['mpi_launcher'], lambda v: isinstance(v, int), "not an int"),
+    ('thrs', lambda p: p['omp'], lambda v: isinstance(v, int), "not an int"),
+    ('jobs', lambda p: True, lambda v: isinstance(v, int) and v > 0, "not a positive int"),
+    ('tollerance', lambda p: True, lambda v: isinstance(v, float), "not a float"),
+)
+
+
+@lru_cache(maxsize=1)
+def default_tests_dir():
+    """
+    Return the workflow tests directory shipped with the package.
+    """
+    return importlib.resources.files("yambo_tester") / "tests"
+
+
+@lru_cache(maxsize=1)
+def default_config_file():
+    """
+    Return the config.toml template shipped with the package.
+    """
+    return importlib.resources.files("yambo_tester.data") / "config.toml"
+
+
 def load_config():
     """
     Look for a config.toml file in the current directory.
@@ -61,9 +98,9 @@ def load_config():
             config = tomllib.load(f)
             config['config'] = local_config
     else:
-        with importlib.resources.open_binary("yambo_tester.data", "config.toml") as f:
+        with default_config_file().open("rb") as f:
             config = tomllib.load(f)
-            config['config'] = importlib.resources.files("yambo_tester.data") / "config.toml"
+            config['config'] = default_config_file()
 
     config.setdefault("parameters", {})
     if config["parameters"].get("download_link"):
@@ -71,11 +108,9 @@ def load_config():
     config.setdefault("executables", {})
 
     # Overwrite default parameters with those read from the config file.
-    for parameter in PARAMETERS:
-        if parameter not in config["parameters"]:
-            config["parameters"][parameter] = PARAMETERS[parameter]
+    config["parameters"] = PARAMETERS | config["parameters"]
     if not config['parameters']['tests_dir']:
-        config['parameters']['tests_dir'] = PARAMETERS['tests_dir']
+        config['parameters']['tests_dir'] = default_tests_dir()
 
     # Drop legacy top-level executable fields. The executable registry lives in [executables].
     for name in LEGACY_PARAMETER_EXECUTABLES:
@@ -101,7 +136,32 @@ def load_config():
     return config
 
 
-def _resolve_candidate_executable(executable, yambo_bin=None):
+def scan_path():
+    """
+    Index the entries of the directories in $PATH with a single scan.
+
+    Returns a dict mapping each file name to the list of its paths, in
+    $PATH order, so that several executables can be looked up without
+    walking $PATH once per name.
+    """
+    path_index = {}
+    for directory in os.environ.get('PATH', os.defpath).split(os.pathsep):
+        if not directory:
+            continue
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    path_index.setdefault(entry.name, []).append(entry.path)
+        except OSError:
+            continue
+    return path_index
+
+
+def _is_executable(path):
+    return os.path.isfile(path) and os.access(path, os.X_OK)
+
+
+def _resolve_candidate_executable(executable, yambo_bin=None, path_index=None):
     if not executable:
         return None
 
@@ -109,6 +169,16 @@ def _resolve_candidate_executable(executable, yambo_bin=None):
     if yambo_bin and not candidate.is_absolute() and len(candidate.parts) == 1:
         candidate = Path(yambo_bin).joinpath(candidate)
 
+    if len(candidate.parts) > 1:
+        # An explicit path, e.g. inside yambo_bin: only that file is checked.
+        return candidate if _is_executable(candidate) else None
+
+    if path_index is not None:
+        for path in path_index.get(candidate.name, []):
+            if _is_executable(path):
+                return Path(path)
+        return None
+
     resolved = shutil.which(str(candidate))
     if resolved is None:
         return None
@@ -125,24 +195,50 @@ def get_executable(parameters, name):
     return parameters.get(name)
 
 
-def check_dir(par, directory, logger):
+def _not_a_directory(par, directory, logger):
+    e = NotADirectoryError(f"{par}: {directory} exists but it is not a directory.")
+    logger.error(e)
+    raise e
+
+
+def require_dir(par, directory, logger):
+    """
+    Return the resolved path of a directory that must already exist.
+    """
+    pathdir = Path(directory).resolve()
+    # A single stat tells both whether the path exists and whether it is a directory.
     try:
-        pathdir = Path(directory).resolve()
-        if pathdir.is_dir():
-            logger.info(f'{par}: {pathdir}')
-        else:
-            raise NotADirectoryError(f"{par}: {directory} exists but it is not a directory.")
-    except NotADirectoryError as e:
-        if par in ['scratch_dir', 'cache_dir'] and not pathdir.exists():
-            logger.warning(f"I'm making the {par} directory!")
-            pathdir.mkdir()
-        else:
-            logger.error(e)
-            raise e
+        mode = os.stat(pathdir).st_mode
+    except OSError:
+        mode = None
+    if mode is None or not stat.S_ISDIR(mode):
+        _not_a_directory(par, directory, logger)
+    logger.info(f'{par}: {pathdir}')
     return pathdir
 
 
-def get_yambo_info(yambo: str) -> dict:
+def ensure_dir(par, directory, logger):
+    """
+    Return the resolved path of a directory, creating it when it is missing.
+    """
+    pathdir = Path(directory).resolve()
+    try:
+        pathdir.mkdir(parents=True)
+        logger.warning(f"I'm making the {par} directory!")
+    except FileExistsError:
+        if not pathdir.is_dir():
+            _not_a_directory(par, directory, logger)
+        logger.info(f'{par}: {pathdir}')
+    return pathdir
+
+
+def check_dir(par, directory, logger):
+    if par in AUTO_CREATED_DIRS:
+        return ensure_dir(par, directory, logger)
+    return require_dir(par, directory, logger)
+
+
+def get_yambo_info(yambo: str, cache_dir=None) -> dict:
     """
     Retrieve version and compilation configuration information from a Yambo executable.
 
@@ -151,10 +247,17 @@ def get_yambo_info(yambo: str) -> dict:
     build configuration. The returned data is provided as a dictionary for easy
     programmatic access.
 
+    Results are memoised per executable path, modification time and size, so
+    ``yambo -h`` is only spawned again when the executable changes. When
+    ``cache_dir`` is given, the results are also stored in
+    ``cache_dir/yambo_info.json`` and reused by later runs.
+
     Parameters
     ----------
     yambo : str
         Path to the Yambo executable.
+    cache_dir : Path, optional
+        Directory holding the persistent ``yambo_info.json`` cache.
 
     Returns
     -------
@@ -165,6 +268,60 @@ def get_yambo_info(yambo: str) -> dict:
         * ``version`` — Yambo version: a list like [magior, minor, patch].
         * ``compilation`` — Details about configuration options.
     """
+    yambo = str(yambo)
+    st = os.stat(yambo)
+    cache_file = str(Path(cache_dir).joinpath(YAMBO_INFO_CACHE)) if cache_dir else None
+    info = _cached_yambo_info(yambo, st.st_mtime_ns, st.st_size, cache_file)
+    return dict(info)
+
+
+@lru_cache(maxsize=32)
+def _cached_yambo_info(yambo, mtime_ns, size, cache_file):
+    entries = {}
+    if cache_file:
+        try:
+            with open(cache_file) as f:
+                entries = json.load(f)
+        except (OSError, json.JSONDecodeError, UnicodeDecodeError):
+            # A missing, truncated or corrupt cache is a cache miss.
+            entries = {}
+        if not isinstance(entries, dict):
+            entries = {}
+        entry = entries.get(yambo)
+        if (isinstance(entry, dict) and 'info' in entry
+                and entry.get('mtime_ns') == mtime_ns and entry.get('size') == size):
+            return entry['info']
+
+    info = _run_yambo_info(yambo)
+    if cache_file:
+        entries[yambo] = {'mtime_ns': mtime_ns, 'size': size, 'info': info}
+        _write_json_atomic(cache_file, entries)
+    return info
+
+
+def _write_json_atomic(path, data):
+    """
+    Write data as JSON to path, or leave path untouched on failure.
+
+    The JSON is written to a temporary file in the same directory and then
+    renamed over path, so processes sharing the cache directory never read a
+    partially written file.
+    """
+    directory, name = os.path.split(path)
+    try:
+        fd, tmp_file = tempfile.mkstemp(prefix=name + ".", suffix=".part", dir=directory or None)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_file, path)
+        except BaseException:
+            Path(tmp_file).unlink(missing_ok=True)
+            raise
+    except OSError:
+        pass
+
+
+def _run_yambo_info(yambo):
     process = subprocess.run([str(yambo), "-h"], capture_output=True, text=True)
     info = {}
     for line in process.stderr.split('\n'):
@@ -227,8 +384,7 @@ def check_parameters(parameters, executables=None, logger=None):
         if Path('config.toml').exists():
             logger.error('File config.toml already exists!')
         else:
-            config_default = importlib.resources.files("yambo_tester.data") / "config.toml"
-            shutil.copyfile(config_default, 'config.toml')
+            shutil.copyfile(default_config_file(), 'config.toml')
             logger.info("Copied the config.toml template.")
 
     else:
@@ -243,9 +399,16 @@ def check_parameters(parameters, executables=None, logger=None):
         )
     
         # Checks on executables
+        path_index = scan_path()
+        lookups = {}
         resolved_executables = {}
         for name, executable in executables.items():
-            resolved = _resolve_candidate_executable(executable, parameters['yambo_bin'])
+            # Several names may point to the same binary: resolve it only once.
+            if executable not in lookups:
+                lookups[executable] = _resolve_candidate_executable(
+                    executable, parameters['yambo_bin'], path_index
+                )
+            resolved = lookups[executable]
             if resolved is not None:
                 resolved_executables[name] = resolved
                 logger.info(f"{name}: {resolved}")
@@ -258,40 +421,31 @@ def check_parameters(parameters, executables=None, logger=None):
         parameters['executables'] = resolved_executables
 
         # Extract info from "yambo -h"
-        yambo_info = get_yambo_info(parameters['executables']['yambo'])
+        yambo_info = get_yambo_info(parameters['executables']['yambo'], parameters['cache_dir'])
         parameters.update(yambo_info)
         parameters = resolve_runtime_yambo_version(parameters, yambo_info, logger)
         if parameters.get('download_link'):
             logger.info(f"download_link: {parameters['download_link']}")
         
         if parameters['mpi_launcher']:
-            try:
-                parameters['mpi_launcher'] = Path(shutil.which(parameters['mpi_launcher']))
-                logger.info(f"mpi_launcher: {parameters['mpi_launcher']}")
-            except TypeError:
+            mpi_launcher = _resolve_candidate_executable(
+                parameters['mpi_launcher'], path_index=path_index
+            )
+            if mpi_launcher is None:
                 raise FileNotFoundError(f"mpi_launcher: {parameters['mpi_launcher']} do not exist.")
+            parameters['mpi_launcher'] = mpi_launcher
+            logger.info(f"mpi_launcher: {parameters['mpi_launcher']}")
         
-        # Checks on nprocs, omp and tollerance
-        if parameters['mpi'] and parameters["mpi_launcher"]:
-            if isinstance(parameters['nprocs'], int):
-                logger.info(f"nprocs: {parameters['nprocs']}")
-            else:
-                msg = f"nprocs: {parameters['nprocs']} not an int."
-                logger.error(msg)
-                raise TypeError(msg)
-        if parameters['omp']:
-            if isinstance(parameters['thrs'], int):
-                logger.info(f"thrs: {parameters['thrs']}")
-            else:
-                msg = f"thrs: {parameters['thrs']} not an int."
+        # Checks on nprocs, omp, jobs and tollerance
+        parameters.setdefault('jobs', 1)
+        for par, used, valid, error in NUMERIC_CHECKS:
+            if not used(parameters):
+                continue
+            if not valid(parameters[par]):
+                msg = f"{par}: {parameters[par]} {error}."
                 logger.error(msg)
                 raise TypeError(msg)
-        if isinstance(parameters['tollerance'], float):
-            logger.info(f"tollerance: {parameters['tollerance']}")
-        else:
-            msg = f"tollerance: {parameters['tollerance']} not a float."
-            logger.error(msg)
-            raise TypeError(msg)
+            logger.info(f"{par}: {parameters[par]}")
 
     return parameters
 
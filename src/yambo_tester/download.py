@@ -1,12 +1,27 @@
 # Copyright (c) 2025 Nicola Spallanzani
 # Licensed under the MIT License. See LICENSE file for details.
 
+import os
 import hashlib
 import argparse
-import subprocess
+import threading
+import urllib.request
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from .log import setup_logging
 
+# Upper bound on concurrent tarball downloads.
+MAX_PARALLEL_DOWNLOADS = 8
+# Seconds without network activity before a download is abandoned.
+DOWNLOAD_TIMEOUT = 60
+# Bytes read from the network per chunk.
+COPY_BUFFER_SIZE = 1 << 20
+
+_executor = None
+_executor_lock = threading.Lock()
+# Built once: build_opener() instantiates every default handler on each call.
+_opener = urllib.request.build_opener()
+
 
 def get_args():
     tests_dir = './'
@@ -21,44 +36,82 @@ def get_args():
 
 
 def sha256sum(filepath):
-    hasher = hashlib.sha256()
+    # file_digest reads and hashes in C, without a Python call per chunk.
     with open(filepath, "rb") as f:
-        for chunk in iter(lambda: f.read(8192), b""):
-            hasher.update(chunk)
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def download_executor():
+    """
+    Return the thread pool shared by all tarball downloads of this process.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=MAX_PARALLEL_DOWNLOADS, thread_name_prefix="download"
+            )
+    return _executor
+
+
+def fetch(url, dest):
+    """
+    Download url into dest and return the SHA-256 digest of the data.
+
+    The digest is computed while the data arrives, so the tarball does not have
+    to be read again to verify it. The data is written to a ``.part`` file that
+    is renamed over dest only once the download is complete, so an interrupted
+    download never leaves a truncated tarball in the cache.
+    """
+    dest = Path(dest)
+    part_file = dest.with_name(dest.name + ".part")
+    hasher = hashlib.sha256()
+    try:
+        with _opener.open(url, timeout=DOWNLOAD_TIMEOUT) as response, open(part_file, "wb") as f:
+            while chunk := response.read(COPY_BUFFER_SIZE):
+                hasher.update(chunk)
+                f.write(chunk)
+        os.replace(part_file, dest)
+    except BaseException:
+        part_file.unlink(missing_ok=True)
+        raise
     return hasher.hexdigest()
 
 
-def wget(wargs, logger, verbose=False):
-    cmd = "wget " + wargs
-    process = subprocess.Popen(
-        cmd,
-        stdout = subprocess.PIPE,
-        stderr = subprocess.PIPE,
-        text = True,
-        shell = True
-    )
-    std_out, std_err = process.communicate()
-    if verbose:
-        logger.info(std_out.strip())
-        if std_err: logger.error(std_err)
-    return process
+def wait_download(tar_file, download):
+    """
+    Wait for a download scheduled by download_test, if any.
+
+    Return the SHA-256 digest computed during the download, or None when
+    nothing was downloaded.
+    """
+    if download is None:
+        return None
+    try:
+        return download.result()
+    except Exception as e:
+        raise RuntimeError(f"Download of tarball {tar_file} failed.") from e
 
 
 def download_test(name, run_type, parameters, logger):
     """
     Check if the test tarball exists in the cache directory and download it if it is missing.
+
+    The download runs in the shared download pool. The returned Future is None
+    when the tarball is already cached; pass it to wait_download before using
+    the file.
     """
     if name != run_type:
         tar_name = name + "_" + run_type + ".tar.gz"
     else:
         tar_name = name + ".tar.gz"
-    process = None
+    download = None
 
     try:
-        if not parameters['cache_dir'].is_dir(): raise
-    except:
-        logger.warning(f"Creating cache_dir: {parameters['cache_dir']}")
-        parameters['cache_dir'].mkdir()
+        parameters['cache_dir'].mkdir(parents=True)
+        logger.warning(f"Created cache_dir: {parameters['cache_dir']}")
+    except FileExistsError:
+        pass
 
     tar_file = parameters['cache_dir'].joinpath(tar_name)
     if tar_file.exists():
@@ -66,13 +119,13 @@ def download_test(name, run_type, parameters, logger):
     else:
         try:
             logger.info(f"Downloading file {tar_name}")
-            wargs = f"{parameters['download_link']}/{tar_name} -O {tar_file}"
-            process = wget(wargs, logger, verbose=parameters['verbose'])
+            url = f"{parameters['download_link']}/{tar_name}"
+            download = download_executor().submit(fetch, url, tar_file)
         except:
             logger.error("Not able to download the tarball.")
             raise
 
-    return tar_file, process
+    return tar_file, download
 
     
 if __name__ == '__main__':
@@ -86,6 +139,6 @@ if __name__ == '__main__':
 
     for name, runs in tests.items():
         for run_type in runs:
-            tar_file, process = download_test(name, run_type, patameters, logger)
+            tar_file, download = download_test(name, run_type, patameters, logger)
             print(tar_file)
 
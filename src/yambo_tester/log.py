@@ -56,7 +56,8 @@ def setup_logging(logfile: Path = None, level=logging.INFO, console=True, name=M
         logger.addHandler(console_handler)
 
     logfile.parent.mkdir(parents=True, exist_ok=True)
-    file_handler = logging.FileHandler(logfile, mode="w")
+    # The file is created (and truncated) on the first record, not here.
+    file_handler = logging.FileHandler(logfile, mode="w", delay=True)
     file_handler.setLevel(level)
     file_handler.setFormatter(
         logging.Formatter(
@@ -66,7 +67,7 @@ def setup_logging(logfile: Path = None, level=logging.INFO, console=True, name=M
     )
     logger.addHandler(file_handler)
 
-    logger.info(f"Logging initialized. Log file: {logfile.resolve()}")
+    logger.debug(f"Logging initialized. Log file: {logfile.resolve()}")
     return logger
 
 
@@ -1,6 +1,9 @@
 # Copyright (c) 2026 Nicola Spallanzani
 # Licensed under the MIT License. See LICENSE file for details.
 
+import os
+import tomllib
+from functools import lru_cache
 from pathlib import Path
 
 import numpy as np
@@ -11,48 +14,142 @@ TOO_LARGE = 10e99
 SIGNIFICANCE_THRESHOLD = 1e-3
 
 
+def _significant_mask(abs_ref, abs_out, axis=0):
+    threshold = np.max(abs_ref, axis=axis, keepdims=True) * SIGNIFICANCE_THRESHOLD
+    return (abs_ref >= threshold) | (abs_out >= threshold)
+
+
 def significant_mask(ref_data, out_data):
-    max_abs = np.max(np.abs(ref_data))
-    threshold = max_abs * SIGNIFICANCE_THRESHOLD
-    return (np.abs(ref_data) >= threshold) | (np.abs(out_data) >= threshold)
+    """
+    Return the values that are significant for the comparison.
 
+    The threshold is relative to the largest reference magnitude of each
+    column, so 2-D data is masked column by column.
+    """
+    return _significant_mask(np.abs(ref_data), np.abs(out_data))
 
-def assert_finite_output(data, label):
-    assert np.all(abs(data) < TOO_LARGE) and not np.all(np.isnan(data)), f"{label}: NaN or too large number!"
 
+def significant_columns_close(out_data, ref_data, tol, axis=0, label=None):
+    """
+    Return, for each column, whether all significant values agree.
 
-def assert_close_significant(out_data, ref_data, tol, label):
-    mask = significant_mask(ref_data, out_data)
-    assert np.allclose(out_data[mask], ref_data[mask], rtol=tol, atol=ZERO_DFL), f"{label}: Difference larger than {tol}!"
+    Values agree with the same rule as ``np.allclose(out, ref, rtol=tol,
+    atol=ZERO_DFL)``. For 1-D data a single boolean is returned. With
+    ``axis=1`` each row of a 2-D array is checked instead of each column.
+
+    With ``label``, the output is also checked as by assert_finite_output,
+    reusing the absolute values computed for the comparison.
+
+    The intermediate steps write into two float buffers in place, so large
+    arrays are not copied once per arithmetic step.
+    """
+    out_data = np.asarray(out_data, dtype=np.float64)
+    ref_data = np.asarray(ref_data, dtype=np.float64)
 
+    abs_ref = np.abs(ref_data)
+    scratch = np.abs(out_data)
+    if label is not None:
+        assert_finite_output(scratch, label)
+    insignificant = _significant_mask(abs_ref, scratch, axis)
+    np.logical_not(insignificant, out=insignificant)
 
-def _count_data_rows(path):
-    rows = 0
-    with Path(path).open(encoding="utf-8") as data_file:
-        for line in data_file:
-            stripped = line.strip()
-            if stripped and not stripped.startswith("#"):
-                rows += 1
-    return rows
+    np.subtract(out_data, ref_data, out=scratch)
+    np.abs(scratch, out=scratch)
+    bound = np.multiply(abs_ref, tol, out=abs_ref)
+    bound += ZERO_DFL
+    close = np.less_equal(scratch, bound)
+    close |= insignificant
+    return np.all(close, axis=axis)
+
+
+def assert_finite_output(data, label):
+    # NaN compares false, so one comparison rejects NaN, Inf and too large values.
+    # The comparison loop runs in float64, so single precision data is not
+    # compared against a TOO_LARGE that overflows to inf.
+    # Empty data is rejected as before.
+    finite = np.less(np.abs(data), TOO_LARGE, signature=(np.float64, np.float64, None))
+    assert np.size(data) and np.all(finite), f"{label}: NaN or too large number!"
+
+
+def assert_close_significant(out_data, ref_data, tol, label):
+    ok = significant_columns_close(out_data, ref_data, tol)
+    assert np.all(ok), f"{label}: Difference larger than {tol}!"
 
 
 def load_text_output_data(path):
-    data = np.genfromtxt(str(path), ndmin=2)
-    data_rows = _count_data_rows(path)
-    if data_rows > 1 and data.shape[0] == 1 and data.shape[1] == data_rows:
-        return data.T
+    # Fast path: np.loadtxt parses in C in a single pass; ndmin=2 keeps a
+    # single row or column 2-D.
+    try:
+        return np.loadtxt(path, ndmin=2)
+    except ValueError:
+        # Outputs can hold non-numeric fields such as the Fortran ******
+        # overflow marker. np.genfromtxt reads them as NaN, which the finite
+        # check then reports as a comparison failure.
+        return np.genfromtxt(path, ndmin=2)
+
+
+@lru_cache(maxsize=128)
+def _cached_reference_data(path, mtime_ns, size):
+    # References are vetted files, so they get no fallback: a malformed
+    # reference is an error, not a failed comparison.
+    data = np.loadtxt(path, ndmin=2)
+    data.setflags(write=False)
     return data
 
 
+def load_reference_data(path):
+    """
+    Return the parsed content of a reference file, cached per file.
+
+    A reference is usually compared against several outputs, so it is parsed
+    only once. The cache key includes the modification time and size, so an
+    edited file is parsed again. The returned array is shared between callers
+    and is therefore read-only.
+    """
+    path = str(path)
+    stat = os.stat(path)
+    return _cached_reference_data(path, stat.st_mtime_ns, stat.st_size)
+
+
+@lru_cache(maxsize=16)
+def _cached_toml(path, mtime_ns, size):
+    with open(path, 'rb') as f:
+        return tomllib.load(f)
+
+
+def load_toml(path):
+    """
+    Return the parsed content of a TOML file, cached per file.
+
+    The run directory files are read by several fixtures and parametrization
+    hooks of the same session. As for load_reference_data, an edited file is
+    parsed again. The returned mapping is shared between callers, so copy it
+    before modifying it.
+    """
+    path = str(path)
+    stat = os.stat(path)
+    return _cached_toml(path, stat.st_mtime_ns, stat.st_size)
+
+
+def clear_reference_cache():
+    """
+    Drop all the files cached by load_reference_data and load_toml.
+    """
+    _cached_reference_data.cache_clear()
+    _cached_toml.cache_clear()
+
+
 def compare_text_output(out_file, ref_file, ref, tol, skip_columns):
-    ref_data = load_text_output_data(ref_file)
+    ref_data = load_reference_data(ref_file)
     out_data = load_text_output_data(out_file)
 
-    for col in range(1, ref_data.shape[1]):
-        if col in skip_columns:
-            continue
-        assert_finite_output(out_data[:, col], str(out_file))
-        assert_close_significant(out_data[:, col], ref_data[:, col], tol, ref)
+    columns = [col for col in range(1, ref_data.shape[1]) if col not in skip_columns]
+    if not columns:
+        return
+
+    ok = significant_columns_close(out_data[:, columns], ref_data[:, columns], tol, label=str(out_file))
+    failed = [columns[index] + 1 for index in np.flatnonzero(~ok)]
+    assert not failed, f"{ref}: Difference larger than {tol} in column(s) {failed}!"
 
 
 def _validate_column_number(column, label):
@@ -77,7 +174,7 @@ def compare_text_columns(reference_file, output_file, reference_column, output_c
     if not output_path.exists():
         raise FileNotFoundError(f"output file does not exist: {output_path}")
 
-    ref_data = load_text_output_data(reference_path)
+    ref_data = load_reference_data(reference_path)
     out_data = load_text_output_data(output_path)
     ref_column = selected_column(ref_data, reference_column, "reference")
     out_column = selected_column(out_data, output_column, "output")
@@ -88,5 +185,5 @@ def compare_text_columns(reference_file, output_file, reference_column, output_c
             f"reference has {ref_column.shape[0]} row(s), output has {out_column.shape[0]} row(s)"
         )
 
-    assert_finite_output(out_column, str(output_path))
-    assert_close_significant(out_column, ref_column, tolerance, str(output_path))
+    ok = significant_columns_close(out_column, ref_column, tolerance, label=str(output_path))
+    assert ok, f"{output_path}: Difference larger than {tolerance}!"
@@ -2,17 +2,17 @@
 # Licensed under the MIT License. See LICENSE file for details.
 
 import os
-import toml
+import re
+import sys
+import json
 import shutil
-import pytest
 import tomllib
 import tarfile
 import subprocess
 from pathlib import Path
-import importlib.resources
 from .log import setup_test_logger
-from .config import get_executable
-from .download import download_test, sha256sum
+from .config import default_tests_dir, get_executable
+from .download import download_test, sha256sum, wait_download
 from .versioning import (
     DEFAULT_YAMBO_VERSION,
     resolve_workflow_tarball_url,
@@ -30,6 +30,53 @@ from .selection import (
 )
 
 
+BARE_TOML_KEY = re.compile(r"[A-Za-z0-9_-]+")
+# Seconds between two checks of the stop event while a step runs, and seconds
+# a terminated step is given to exit before it is killed.
+STOP_POLL_INTERVAL = 0.2
+TERMINATE_TIMEOUT = 10
+
+
+def _toml_key(key):
+    return key if BARE_TOML_KEY.fullmatch(key) else _toml_value(key)
+
+
+def _toml_value(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, str):
+        # A JSON string is a valid TOML basic string, except for DEL.
+        return json.dumps(value, ensure_ascii=False).replace("\x7f", "\\u007f")
+    raise TypeError(f"Unsupported value in results.toml: {value!r}")
+
+
+def write_results(path, results):
+    """
+    Write the results of a workflow as TOML.
+
+    results maps scalar metadata and one table per step, holding scalar
+    values only. None values are left out, since TOML has no null.
+    """
+    lines = []
+    tables = []
+    for key, value in results.items():
+        if isinstance(value, dict):
+            tables.append((key, value))
+        elif value is not None:
+            lines.append(f"{_toml_key(key)} = {_toml_value(value)}")
+    for name, table in tables:
+        lines.append(f"\n[{_toml_key(name)}]")
+        lines.extend(
+            f"{_toml_key(key)} = {_toml_value(value)}"
+            for key, value in table.items()
+            if value is not None
+        )
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+
 def step_sort_key(item):
     name, run = item
     return run.get('input', name)
@@ -39,11 +86,22 @@ def stdout_filename(step_name):
     return f"{step_name}.stdout"
 
 
-def build_run_command(run, parameters):
-    cmd = []
+def launcher_prefix(parameters):
+    """
+    Return the MPI launcher shared by all the steps of a workflow, as a list
+    that is empty when the steps run without MPI.
+    """
     if parameters['mpi'] and parameters['mpi_launcher']:
-        nprocs = run.get('nprocs', parameters['nprocs'])
-        cmd.extend([str(parameters['mpi_launcher']), '-np', str(nprocs)])
+        return [str(parameters['mpi_launcher'])]
+    return []
+
+
+def build_run_command(run, parameters, prefix=None):
+    if prefix is None:
+        prefix = launcher_prefix(parameters)
+    cmd = list(prefix)
+    if prefix:
+        cmd.extend(['-np', str(run.get('nprocs', parameters['nprocs']))])
     executable = get_executable(parameters, run['exe'])
     if executable is None:
         raise FileNotFoundError(f"{run['exe']}: executable not available.")
@@ -52,14 +110,37 @@ def build_run_command(run, parameters):
         cmd.extend(['-F', str(run['input'])])
     if run.get('input_dir'):
         cmd.extend(['-I', str(run['input_dir'])])
-    flags = ""
-    if run.get('flags'):
-        flags = f",{run['flags']}"
-    if run.get('output'):
-        cmd.extend(['-J', str(run['output']) + flags, '-C', str(run['output'])])
+    output = run.get('output')
+    if output:
+        output = str(output)
+        flags = run.get('flags')
+        cmd.extend(['-J', f"{output},{flags}" if flags else output, '-C', output])
     return cmd
 
 
+def communicate(process, stop=None):
+    """
+    Wait for process like Popen.communicate and return its (stdout, stderr).
+
+    When the stop event is set while the process runs, the process is
+    terminated, and killed if it does not exit within TERMINATE_TIMEOUT.
+    """
+    if stop is None:
+        return process.communicate()
+    while True:
+        try:
+            return process.communicate(timeout=STOP_POLL_INTERVAL)
+        except subprocess.TimeoutExpired:
+            if stop.is_set():
+                break
+    process.terminate()
+    try:
+        return process.communicate(timeout=TERMINATE_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        return process.communicate()
+
+
 def command_reference_output(std_out, run, run_dir):
     return std_out
 
@@ -72,8 +153,9 @@ def source_workflow_config(test, parameters):
         return tomllib.load(f)
 
 
-def parameters_with_workflow_download_link(test, parameters, logger):
-    workflow_config = source_workflow_config(test, parameters)
+def parameters_with_workflow_download_link(test, parameters, logger, workflow_config=None):
+    if workflow_config is None:
+        workflow_config = source_workflow_config(test, parameters)
     yambo_version = parameters.get('yambo_version') or DEFAULT_YAMBO_VERSION
     if not workflow_supports_version(workflow_config, yambo_version):
         logger.info(f"[{test['name']}/{test['type']}] skipped download for unsupported Yambo version {yambo_version}")
@@ -91,8 +173,8 @@ def parameters_with_workflow_download_link(test, parameters, logger):
     return resolved
 
 
-def download_workflow_tarball(test, parameters, logger):
-    resolved_parameters = parameters_with_workflow_download_link(test, parameters, logger)
+def download_workflow_tarball(test, parameters, logger, workflow_config=None):
+    resolved_parameters = parameters_with_workflow_download_link(test, parameters, logger, workflow_config)
     if resolved_parameters is None:
         return None, None
     return download_test(test['name'], test['type'], resolved_parameters, logger)
@@ -110,12 +192,14 @@ def setup_rundir(test, parameters, logger):
     :param parameters: dict containg parameters metadata.
     :param logger: main logger instance.
     :return: tuple containing the Path to the created test directory and run directory.
+
+    The parsed tests.toml is stored in test['workflow_config'], so that run_test does not
+    parse it again.
     """
     this_test = f"[{test['name']}/{test['type']}]"
 
     try:
-        if not parameters['scratch_test'].exists():
-            parameters['scratch_test'].mkdir(exist_ok=True)
+        parameters['scratch_test'].mkdir(parents=True, exist_ok=True)
         test_dir = parameters['scratch_test'].joinpath(test['name'])
         test_dir.mkdir(exist_ok=True)
         logger.info(f"Working in {test_dir}")
@@ -139,20 +223,22 @@ def setup_rundir(test, parameters, logger):
     else:
         logger.error(f"{local_config} not available")
         raise FileNotFoundError(f"{local_config} not available") 
+    test['workflow_config'] = config
 
     yambo_version = parameters.get('yambo_version') or DEFAULT_YAMBO_VERSION
     if workflow_supports_version(config, yambo_version):
-        tar_file, process = download_workflow_tarball(test, parameters, logger)
+        tar_file, download = download_workflow_tarball(test, parameters, logger, config)
         try:
-            if process is not None:
-                retcode = process.wait()
-                if retcode != 0:
-                    raise RuntimeError(f"Download of tarball {tar_file} failed.")
+            digest = wait_download(tar_file, download)
             if not parameters['nochecksum']:
-                if not config['sha256'] == sha256sum(tar_file):
+                # A fresh download was hashed on the fly, a cached one is read here.
+                if digest is None:
+                    digest = sha256sum(tar_file)
+                if not config['sha256'] == digest:
                     logger.error(f"SHA-256 mismatch for file '{tar_file.name}'.")
                     raise ValueError(f"SHA-256 mismatch for file '{tar_file.name}'.")
-            with tarfile.open(tar_file) as tar:
+            # Stream mode reads the archive sequentially, without seeking back.
+            with tarfile.open(tar_file, "r|*") as tar:
                 tar.extractall(path=test_dir)
             logger.info(f"Extracted tarball")
         except RuntimeError as e:
@@ -167,19 +253,22 @@ def setup_rundir(test, parameters, logger):
     return test_dir, run_dir
 
 
-def run_test(test, parameters, logger, verbose=False):
+def run_test(test, parameters, logger, verbose=False, stop=None):
     this_test = f"[{test['name']}/{test['type']}]"
     local_logger = setup_test_logger(test['run_dir'])
 
-    local_config = test['run_dir'].joinpath("tests.toml")
-    with open(local_config, "rb") as f:
-        workflow_config = tomllib.load(f)
+    workflow_config = test.get('workflow_config')
+    if workflow_config is None:
+        local_config = test['run_dir'].joinpath("tests.toml")
+        with open(local_config, "rb") as f:
+            workflow_config = tomllib.load(f)
 
-    SAVE_converted = test['run_dir'].joinpath('SAVE_converted')
-    SAVE = test['run_dir'].joinpath('SAVE')
-    if SAVE_converted.exists():
-        oldSAVE = SAVE.rename(test['run_dir'].joinpath('oldSAVE'))
-        SAVE = SAVE_converted.rename(SAVE)
+    # Use the converted SAVE when the tarball provides one, keeping the original as oldSAVE.
+    SAVE_converted = os.path.join(test['run_dir'], 'SAVE_converted')
+    if os.path.lexists(SAVE_converted):
+        SAVE = os.path.join(test['run_dir'], 'SAVE')
+        os.replace(SAVE, os.path.join(test['run_dir'], 'oldSAVE'))
+        os.replace(SAVE_converted, SAVE)
 
     yambo_version = parameters.get('yambo_version') or DEFAULT_YAMBO_VERSION
     config = workflow_steps_for_version(workflow_config, yambo_version)
@@ -199,8 +288,7 @@ def run_test(test, parameters, logger, verbose=False):
                 "skip_reason": UNSUPPORTED_VERSION_REASON,
                 "runlevel": run.get("runlevel", ""),
             }
-        with open(test['run_dir'].joinpath("results.toml"), "w") as f:
-            toml.dump(results, f)
+        write_results(test['run_dir'].joinpath("results.toml"), results)
         local_logger.info(f"{this_test} skipped for unsupported Yambo version {yambo_version}")
         return local_logger
 
@@ -211,9 +299,13 @@ def run_test(test, parameters, logger, verbose=False):
     # For OpenMP pralallelization
     env = os.environ.copy()
     if parameters['omp']: env["OMP_NUM_THREADS"] = str(parameters['thrs'])
+    prefix = launcher_prefix(parameters)
 
     # Loop that launches the subtests
     for name, run in subtests:
+        if stop is not None and stop.is_set():
+            local_logger.warning(f"{this_test} interrupted: {name} and the following steps not launched")
+            break
         if name not in selected_names:
             results[name] = {
                 "returncode": RUNLEVEL_FILTER_RETURNCODE,
@@ -247,7 +339,7 @@ def run_test(test, parameters, logger, verbose=False):
                             local_logger.warning(f"{this_test} action failed: {cmd}")
 
             # Generation of the command line for the test
-            cmd = build_run_command(run, parameters)
+            cmd = build_run_command(run, parameters, prefix)
 
             # Launching the test
             logger.info(f"{this_test} Launching {name}")
@@ -261,7 +353,7 @@ def run_test(test, parameters, logger, verbose=False):
                 shell = False,
                 env = env
             )
-            std_out, std_err = process.communicate()
+            std_out, std_err = communicate(process, stop)
             stdout_file = test['run_dir'].joinpath(stdout_filename(name))
             stdout_file.write_text(command_reference_output(std_out, run, test['run_dir']))
             if verbose: local_logger.info(std_out.strip())
@@ -290,13 +382,20 @@ def run_test(test, parameters, logger, verbose=False):
                 "runlevel": run.get("runlevel", ""),
             }
 
-    with open(test['run_dir'].joinpath("results.toml"), "w") as f:
-        toml.dump(results, f)
+    write_results(test['run_dir'].joinpath("results.toml"), results)
         
     return local_logger
 
 
-def run_pytest(test, local_logger, verbose=False):
+def run_pytest(test, local_logger, verbose=False, isolated=False, stop=None):
+    """
+    Check the results of one workflow with the validation tests of the package.
+
+    With isolated=True pytest runs in a separate interpreter, so several
+    workflows can be validated at the same time: pytest.main() is not
+    thread-safe. Its output is written in one block once the run is over,
+    and setting the stop event terminates it.
+    """
     args = []
 
     if verbose:
@@ -305,8 +404,7 @@ def run_pytest(test, local_logger, verbose=False):
         args.append("-q")
     local_logger.info(f"[{test['name']}/{test['type']}] Start checking results with pytest")
 
-    #validation_tests_dir = Path(__file__).parent / "tests"
-    validation_tests_dir = importlib.resources.files("yambo_tester") / "tests"
+    validation_tests_dir = default_tests_dir()
 
     if not validation_tests_dir.exists():
         local_logger.error(f"Validation tests directory not found: {validation_tests_dir}")
@@ -317,6 +415,22 @@ def run_pytest(test, local_logger, verbose=False):
     args.append(f"--junitxml={report_path}")
 
     args.append(f"--rundir={test['run_dir']}")
+    # No .pytest_cache: nothing reads it, and the package directory may be read-only.
+    args.extend(["-p", "no:cacheprovider"])
+    if isolated:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "pytest", *args, str(validation_tests_dir)],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        std_out, std_err = communicate(process, stop)
+        sys.stdout.write(std_out + std_err)
+        sys.stdout.flush()
+        return process.returncode
+
+    # Imported here: pytest is heavy and only needed once results are checked.
+    import pytest
     # Run pytest in the tests folder of the package
     return pytest.main(args + [str(validation_tests_dir)])
 
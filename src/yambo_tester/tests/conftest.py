@@ -2,37 +2,50 @@
 # Licensed under the MIT License. See LICENSE file for details.
 
 import pytest
-import tomllib
 from pathlib import Path
+from yambo_tester.reference_compare import clear_reference_cache, load_toml
 
 
 def pytest_addoption(parser):
     parser.addoption(
         "--rundir",
         action="store",
-        help="Directory where yambo-tester stored the results.yaml",
+        help="Directory where yambo-tester stored the results.toml",
     )
 
 
+@pytest.fixture(scope="session", autouse=True)
+def reference_cache():
+    """
+    Share parsed reference files between the checks of one session.
+
+    References and the TOML files of the run directory are read through a
+    cache, so a file used by several checks is parsed once. The cache is
+    emptied when the session ends, so validating many workflows in one
+    process does not keep their references in memory.
+    """
+    yield
+    clear_reference_cache()
+
+
 @pytest.fixture
 def rundir(request):
     """Return the path of the run directory passed by --rundir."""
     value = request.config.getoption("--rundir")
     if value is None:
         pytest.fail("Missing required option --rundir")
-    return Path(value)
+    return Path(value).absolute()
 
 
 @pytest.fixture
 def results(rundir):
-    """Load and return the results.yaml content."""
-    results_file = rundir / "results.yaml"
+    """Load and return the results.toml content."""
+    results_file = rundir / "results.toml"
 
     if not results_file.exists():
-        pytest.fail(f"Missing results.yaml in {rundir}")
+        pytest.fail(f"Missing results.toml in {rundir}")
 
-    with open(results_file, 'rb') as f:
-        data = tomllib.load(f)
+    data = load_toml(results_file)
 
     if not isinstance(data, dict):
         pytest.fail("results.toml must contain a mapping of run_name -> info")
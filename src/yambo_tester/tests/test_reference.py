@@ -1,8 +1,9 @@
 # Copyright (c) 2025 Nicola Spallanzani
 # Licensed under the MIT License. See LICENSE file for details.
 
+import os
+import mmap
 import pytest
-import tomllib
 import numpy as np
 import netCDF4 as nc
 from glob import glob
@@ -14,7 +15,10 @@ from yambo_tester.reference_compare import (
     assert_close_significant,
     assert_finite_output,
     compare_text_output,
+    load_reference_data,
     load_text_output_data,
+    load_toml,
+    significant_columns_close,
     significant_mask,
 )
 from yambo_tester.selection import (
@@ -25,6 +29,12 @@ from yambo_tester.selection import (
 from yambo_tester.versioning import DEFAULT_YAMBO_VERSION, workflow_steps_for_version
 
 METADATA_KEYS = {"sha256"}
+REPORT_COMPLETE_MARKER = b"Game Over & Game summary"
+SKIPPED_RETURNCODES = frozenset({
+    MISSING_EXECUTABLE_RETURNCODE,
+    RUNLEVEL_FILTER_RETURNCODE,
+    UNSUPPORTED_VERSION_RETURNCODE,
+})
 
 
 def normalize_reference(reference):
@@ -68,30 +78,78 @@ def normalize_reference(reference):
     }
 
 
+def read_leading_values(variable, count):
+    """
+    Return the first ``count`` values of a netCDF variable, flattened.
+
+    Only the leading rows of the first dimension that hold those values are
+    read from the file, instead of the whole variable.
+    """
+    if variable.ndim == 0:
+        return np.atleast_1d(variable[...])[:count]
+    row_size = int(np.prod(variable.shape[1:]))
+    rows = -(-count // row_size) if row_size else 0
+    return variable[:rows].reshape(-1)[:count]
+
+
+def read_database_variables(out_file, variables, count=None):
+    """
+    Read the requested netCDF variables as flattened arrays.
+
+    The dataset is opened once and automatic masking is disabled, so every
+    variable is returned as a plain ndarray instead of a masked array. The
+    values keep the dtype stored in the file; callers convert them when
+    copying into their own buffers. With ``count``, at most that many leading
+    values are read from each variable.
+    """
+    with nc.Dataset(str(out_file)) as ds:
+        ds.set_auto_mask(False)
+        if count is None:
+            return [ds[variable][:].ravel() for variable in variables]
+        return [read_leading_values(ds[variable], count) for variable in variables]
+
+
 def compare_database(out_file, ref_file, variables, ref, tol):
-    ref_data = np.genfromtxt(str(ref_file))
+    """
+    Compare netCDF variables with a flat reference holding ``ndata`` values
+    per variable, one variable after the other.
+
+    The reference is read through the same cache as the text references.
+    """
+    ref_data = load_reference_data(ref_file).ravel()
     nvars = len(variables)
     ndata = len(ref_data) // nvars
+    ref_data = ref_data[:nvars * ndata].reshape(nvars, ndata)
+
+    out_data = np.empty((nvars, ndata), dtype=np.float64)
+    out_arrays = read_database_variables(out_file, variables, ndata)
+    for index, (variable, values) in enumerate(zip(variables, out_arrays)):
+        assert values.size >= ndata, f"{ref}: {variable} has {values.size} value(s), expected {ndata}!"
+        out_data[index] = values[:ndata]
 
-    ds = nc.Dataset(str(out_file))
-    for i in range(nvars):
-        out_data = ds[variables[i]][:].ravel()
-        assert_finite_output(out_data, str(out_file))
+    ok = significant_columns_close(out_data, ref_data, tol, axis=1, label=str(out_file))
+    failed = [variables[index] for index in np.flatnonzero(~ok)]
+    assert not failed, f"{ref}: Difference larger than {tol} in {', '.join(failed)}!"
 
-        start, stop = i * ndata, i * ndata + ndata
-        expected = ref_data[start:stop]
-        actual = out_data[:len(expected)]
-        assert_close_significant(actual, expected, tol, ref)
 
+def resolve_output_file(rundir, odir, ref, path, reports=None):
+    """
+    Return the output file checked against reference ``ref``.
 
-def resolve_output_file(rundir, odir, ref, path):
+    Report files are looked up with a glob of the output directory; passing
+    a ``reports`` dict memoizes that glob per directory across calls.
+    """
     if ref == "STDOUT":
         return rundir.joinpath(path)
 
     if ref[:2] == 'r-':
         if path:
             return rundir.joinpath(path)
-        tmp = glob(str(rundir.joinpath(odir)) + '/r-*')
+        if reports is None:
+            reports = {}
+        if odir not in reports:
+            reports[odir] = glob(str(rundir.joinpath(odir)) + '/r-*')
+        tmp = reports[odir]
         if tmp:
             return Path(tmp[0])
         return rundir.joinpath(odir, ref)
@@ -105,6 +163,22 @@ def resolve_output_file(rundir, odir, ref, path):
     return rundir.joinpath(odir, ref)
 
 
+def reference_kind(ref):
+    """
+    Return which check a reference name selects: "stdout", "report",
+    "database", "text", or None when only the files are checked to exist.
+    """
+    if ref == "STDOUT":
+        return "stdout"
+    if ref[:2] == 'r-':
+        return "report"
+    if '.ndb.' in ref or '.ns.' in ref:
+        return "database"
+    if ref[:2] == 'o-':
+        return "text"
+    return None
+
+
 def string_check_spec(ref, ref_spec, result):
     if ref == "STDOUT":
         return {
@@ -124,6 +198,17 @@ def string_check_spec(ref, ref_spec, result):
     }
 
 
+def report_is_complete(path):
+    """
+    Return whether a Yambo report file contains the final game summary marker.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return False
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return mm.find(REPORT_COMPLETE_MARKER) != -1
+
+
 def assert_file_contains(path, expected, label):
     if not expected:
         return
@@ -162,14 +247,15 @@ def pytest_generate_tests(metafunc):
             )
         return
 
-    rundir = Path(rundir_option)
-    with open(rundir / "results.toml", 'rb') as f:
-        results = tomllib.load(f)
+    # Absolute paths keep the items valid whatever the working directory of
+    # the process that runs them.
+    rundir = Path(rundir_option).absolute()
+    results = dict(load_toml(rundir / "results.toml"))
     tollerance = results.pop('tollerance', None)
+    if tollerance is not None:
+        tollerance = float(tollerance)
     yambo_version = results.pop('yambo_version', DEFAULT_YAMBO_VERSION)
-    with open(rundir / "tests.toml", 'rb') as f:
-        workflow_config = tomllib.load(f)
-    tests = workflow_steps_for_version(workflow_config, yambo_version)
+    tests = workflow_steps_for_version(load_toml(rundir / "tests.toml"), yambo_version)
 
     # Sequence for test_runs_ok func
     if "run_item" in metafunc.fixturenames:
@@ -183,30 +269,38 @@ def pytest_generate_tests(metafunc):
     # Sequence for test_reference_ok func
     if "ref_item" in metafunc.fixturenames:
         items = []
+        reports = {}
+        rundir_str = str(rundir)
         for key, val in tests.items():
             if key in METADATA_KEYS:
                 continue
-            skip = results[key]['returncode'] in {
-                MISSING_EXECUTABLE_RETURNCODE,
-                RUNLEVEL_FILTER_RETURNCODE,
-                UNSUPPORTED_VERSION_RETURNCODE,
-            }
+            result = results[key]
+            skip = result['returncode'] in SKIPPED_RETURNCODES
+            run_dir = result["run_dir"]
+            stdout = result.get("stdout", "")
+            odir = val.get('output', '')
             for r, o in val['reference'].items():
                 ref_spec = normalize_reference(o)
-                string_spec = string_check_spec(r, ref_spec, results[key])
+                string_spec = string_check_spec(r, ref_spec, result)
+                out_file = None
+                if not skip:
+                    out_file = resolve_output_file(rundir, odir, r, string_spec["path"], reports)
                 items.append((r,{'out': o,
                                  'path': string_spec["path"],
                                  'variables': ref_spec["variables"],
                                  'skip_columns': ref_spec["skip_columns"],
                                  'whitelist': ref_spec["whitelist"],
                                  'exe': val["exe"],
-                                 'dir': str(rundir),
-                                 'run_dir': results[key]["run_dir"],
-                                 'stdout': results[key].get("stdout", ""),
-                                 'tol': ref_spec["tolerance"] or tollerance,
-                                 'odir': val.get('output', ''),
+                                 'dir': rundir_str,
+                                 'run_dir': run_dir,
+                                 'stdout': stdout,
+                                 'tol': float(ref_spec["tolerance"]) if ref_spec["tolerance"] else tollerance,
+                                 'odir': odir,
                                  'contains': string_spec["contains"],
                                  'skip': skip,
+                                 'kind': reference_kind(r),
+                                 'ref_file': rundir.joinpath('REFERENCE', r),
+                                 'out_file': out_file,
                                  }))
         metafunc.parametrize(
             "ref_item",
@@ -238,16 +332,16 @@ def test_reference_ok(ref_item):
     if info['skip']:
         pytest.skip("Test skipped before reference validation")
     else:
-        rundir = Path(info['dir'])
-        tol = float(info['tol'])
-        ref_file = rundir.joinpath('REFERENCE', ref)
-        out_file = resolve_output_file(rundir, info['odir'], ref, info['path'])
+        tol = info['tol']
+        ref_file = info['ref_file']
+        out_file = info['out_file']
+        kind = info['kind']
     
         # Check if reference and output files exist
-        if ref != "STDOUT" and not ref[:2] == 'r-': assert ref_file.exists(), f"{ref} file do not exists!"
-        assert out_file.exists(), f"{info['out']} file do not exists!"
+        if kind not in ("stdout", "report"): assert os.path.exists(ref_file), f"{ref} file do not exists!"
+        assert os.path.exists(out_file), f"{info['out']} file do not exists!"
 
-        if ref == "STDOUT":
+        if kind == "stdout":
             assert_stdout_or_log_contains(
                 info['stdout'],
                 info['run_dir'],
@@ -257,7 +351,7 @@ def test_reference_ok(ref_item):
             )
 
         # Check text output files
-        if ref[:2] == 'o-' and not ('.ndb.' in ref or '.ns.' in ref):
+        if kind == "text":
             try:
                 compare_text_output(out_file, ref_file, ref, tol, info['skip_columns'])
             except AssertionError as e:
@@ -266,7 +360,7 @@ def test_reference_ok(ref_item):
                 raise
     
         # Check output DBs
-        if '.ndb.' in ref or '.ns.' in ref:
+        if kind == "database":
             try:
                 compare_database(out_file, ref_file, info['variables'], ref, tol)
             except AssertionError as e:
@@ -275,10 +369,6 @@ def test_reference_ok(ref_item):
                 raise
     
         # Check report files
-        if ref[:2] == 'r-':
-            report = False
-            with open(str(out_file), 'rb') as f:
-                for line in f:
-                    if b"Game Over & Game summary" in line: report = True
-            assert report, f"{ref}: report file incomplete!"
+        if kind == "report":
+            assert report_is_complete(out_file), f"{ref}: report file incomplete!"
             assert_file_contains(out_file, info['contains'], ref)
@@ -0,0 +1,252 @@
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+import tomllib
+from concurrent.futures import Future
+from pathlib import Path
+
+import pytest
+
+from yambo_tester import cli
+from yambo_tester.log import setup_test_logger
+
+
+class _Download(Future):
+    def __init__(self, events, name, error=None):
+        super().__init__()
+        self.events = events
+        self.name = name
+        self.error = error
+
+    def result(self, timeout=None):
+        self.events.append(("wait", self.name))
+        if self.error is not None:
+            raise self.error
+        return None
+
+
+def _download_only_config(tmp_path, tests):
+    return {
+        "config": tmp_path / "config.toml",
+        "executables": {},
+        "parameters": {
+            "logger": str(tmp_path / "main.log"),
+            "init": False,
+            "verbose": False,
+            "donly": True,
+            "nochecksum": False,
+            "label": "",
+        },
+        "tests": tests,
+    }
+
+
+def _patch_setup(monkeypatch, config):
+    monkeypatch.setattr(cli, "load_config", lambda: config)
+    monkeypatch.setattr(cli, "set_cl_args", lambda config: config)
+    monkeypatch.setattr(cli, "check_parameters", lambda parameters, executables, logger: parameters)
+
+
+def test_download_only_schedules_all_downloads_before_waiting(monkeypatch, tmp_path):
+    config = _download_only_config(tmp_path, {"Al_bulk": ["DFT", "ELPH"], "He": ["DFT"]})
+    events = []
+
+    def fake_download_workflow_tarball(test, parameters, logger):
+        name = f"{test['name']}_{test['type']}"
+        events.append(("schedule", name))
+        return tmp_path / f"{name}.tar.gz", _Download(events, name)
+
+    _patch_setup(monkeypatch, config)
+    monkeypatch.setattr(cli, "download_workflow_tarball", fake_download_workflow_tarball)
+
+    cli.main()
+
+    assert events == [
+        ("schedule", "Al_bulk_DFT"),
+        ("schedule", "Al_bulk_ELPH"),
+        ("schedule", "He_DFT"),
+        ("wait", "Al_bulk_DFT"),
+        ("wait", "Al_bulk_ELPH"),
+        ("wait", "He_DFT"),
+    ]
+
+
+def test_download_only_reports_failed_download(monkeypatch, tmp_path):
+    config = _download_only_config(tmp_path, {"He": ["DFT"]})
+
+    def fake_download_workflow_tarball(test, parameters, logger):
+        return tmp_path / "He_DFT.tar.gz", _Download([], "He_DFT", OSError("HTTP Error 404"))
+
+    _patch_setup(monkeypatch, config)
+    monkeypatch.setattr(cli, "download_workflow_tarball", fake_download_workflow_tarball)
+
+    with pytest.raises(RuntimeError, match="He_DFT.tar.gz"):
+        cli.main()
+
+
+def test_cli_runs_workflows_concurrently_and_validates_each(monkeypatch, tmp_path):
+    main_log = tmp_path / "main.log"
+    executed = []
+    validated = []
+
+    config = {
+        "config": tmp_path / "config.toml",
+        "executables": {},
+        "parameters": {
+            "logger": str(main_log),
+            "init": False,
+            "verbose": False,
+            "donly": False,
+            "nochecksum": False,
+            "label": "",
+            "jobs": 2,
+        },
+        "tests": {"TestA": ["Case1", "Case2"], "TestB": ["Case1"]},
+    }
+
+    def fake_setup_rundir(test, parameters, logger):
+        run_dir = tmp_path / test["name"] / test["type"]
+        run_dir.mkdir(parents=True, exist_ok=True)
+        return run_dir.parent, run_dir
+
+    def fake_run_test(test, parameters, logger, verbose=False, stop=None):
+        executed.append((test["name"], test["type"]))
+        return setup_test_logger(test["run_dir"])
+
+    def fake_run_pytest(test, local_logger, verbose=False, isolated=False, stop=None):
+        assert isolated
+        validated.append((test["name"], test["type"]))
+        return 0
+
+    _patch_setup(monkeypatch, config)
+    monkeypatch.setattr(cli, "setup_rundir", fake_setup_rundir)
+    monkeypatch.setattr(cli, "run_test", fake_run_test)
+    monkeypatch.setattr(cli, "run_pytest", fake_run_pytest)
+
+    cli.main()
+
+    expected = [("TestA", "Case1"), ("TestA", "Case2"), ("TestB", "Case1")]
+    assert sorted(executed) == expected
+    assert sorted(validated) == expected
+
+    for handler in logging.getLogger("yambo_tester").handlers:
+        handler.flush()
+    main_text = main_log.read_text()
+    for name, test_type in expected:
+        assert f"[{name}/{test_type}] Starting test" in main_text
+        assert f"[{name}/{test_type}] Finished test" in main_text
+
+
+_INTERRUPTED_DRIVER = """
+import sys
+from pathlib import Path
+from yambo_tester import cli
+
+tmp_path, step = Path(sys.argv[1]), sys.argv[2]
+workflow = {"01_first": {"exe": "yambo"}, "02_second": {"exe": "yambo"}}
+config = {
+    "config": tmp_path / "config.toml",
+    "executables": {},
+    "parameters": {
+        "logger": str(tmp_path / "main.log"),
+        "init": False,
+        "verbose": False,
+        "donly": False,
+        "nochecksum": False,
+        "label": "",
+        "jobs": 2,
+        "tollerance": 0.1,
+        "yambo_version": "5",
+        "omp": False,
+        "thrs": 1,
+        "mpi": False,
+        "mpi_launcher": None,
+        "nprocs": 1,
+        "executables": {"yambo": step},
+        "runlevels": [],
+    },
+    "tests": {"TestA": ["Case1", "Case2"]},
+}
+
+def fake_setup_rundir(test, parameters, logger):
+    run_dir = tmp_path / test["type"]
+    run_dir.mkdir()
+    test["workflow_config"] = workflow
+    return run_dir.parent, run_dir
+
+def fake_run_pytest(test, local_logger, verbose=False, isolated=False, stop=None):
+    (test["run_dir"] / "validated").write_text("")
+
+cli.load_config = lambda: config
+cli.set_cl_args = lambda config: config
+cli.check_parameters = lambda parameters, executables, logger: parameters
+cli.setup_rundir = fake_setup_rundir
+cli.run_pytest = fake_run_pytest
+cli.main()
+"""
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def test_cli_sigint_stops_running_workflows(tmp_path):
+    driver = tmp_path / "driver.py"
+    driver.write_text(_INTERRUPTED_DRIVER)
+    step = tmp_path / "step"
+    step.write_text(
+        f"#!{sys.executable}\n"
+        "import os, time\n"
+        "open(f'started-{os.getpid()}', 'w').close()\n"
+        "time.sleep(60)\n"
+    )
+    os.chmod(step, 0o755)
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [str(Path(cli.__file__).parents[1]), env.get("PYTHONPATH", "")]
+    )
+
+    process = subprocess.Popen(
+        [sys.executable, str(driver), str(tmp_path), str(step)],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        env=env,
+    )
+    pids = []
+    try:
+        deadline = time.monotonic() + 30
+        while len(pids) < 2 and time.monotonic() < deadline:
+            pids = [int(path.name.split("-")[1]) for path in tmp_path.glob("Case*/started-*")]
+            time.sleep(0.05)
+        assert len(pids) == 2, process.stderr.read1().decode() if process.poll() is not None else pids
+
+        # SIGINT reaches only the tester here, not the steps, so the tester
+        # itself has to stop them.
+        os.kill(process.pid, signal.SIGINT)
+        process.communicate(timeout=20)
+
+        assert process.returncode != 0
+        assert not any(_pid_alive(pid) for pid in pids)
+        for case in ("Case1", "Case2"):
+            run_dir = tmp_path / case
+            assert len(list(run_dir.glob("started-*"))) == 1
+            assert not (run_dir / "02_second.stdout").exists()
+            assert not (run_dir / "validated").exists()
+            with open(run_dir / "results.toml", "rb") as f:
+                results = tomllib.load(f)
+            assert results["01_first"]["returncode"] == -signal.SIGTERM
+            assert "02_second" not in results
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.communicate()
+        for pid in pids:
+            if _pid_alive(pid):
+                os.kill(pid, signal.SIGKILL)
@@ -1,11 +1,14 @@
 import argparse
+import json
 import logging
 import os
 import sys
+import shutil
 import pytest
 
-from yambo_tester.cli import parse_executable_override, set_cl_args
-from yambo_tester.config import check_parameters, load_config
+from yambo_tester.cli import build_parser, parse_executable_override, set_cl_args
+from yambo_tester import config as config_module
+from yambo_tester.config import check_parameters, default_tests_dir, get_yambo_info, load_config
 
 
 def _write_executable(path, stderr_text="", stdout_text=""):
@@ -43,6 +46,7 @@ def test_load_config_ignores_legacy_executable_fields_and_only_injects_required_
     assert config["executables"]["a2y"] == "table-a2y"
     assert config["executables"]["custom_tool"] == "table-custom"
     assert "ypp" not in config["executables"]
+    assert config["parameters"]["tests_dir"] == default_tests_dir()
 
 
 def test_set_cl_args_registers_executable_overrides(monkeypatch):
@@ -56,6 +60,18 @@ def test_set_cl_args_registers_executable_overrides(monkeypatch):
     assert updated["executables"]["custom_tool"] == "/opt/custom"
 
 
+def test_set_cl_args_fills_flag_defaults_and_reuses_parser(monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["yambo-tester", "--verbose"])
+
+    updated = set_cl_args({"parameters": {"label": "ci"}, "executables": {}})
+
+    assert updated["parameters"]["verbose"] is True
+    assert updated["parameters"]["init"] is False
+    assert updated["parameters"]["donly"] is False
+    assert updated["parameters"]["label"] == "ci"
+    assert build_parser() is build_parser()
+
+
 def test_parse_executable_override_accepts_key_value_pairs():
     assert parse_executable_override("ypp=/opt/ypp") == ("ypp", "/opt/ypp")
 
@@ -282,3 +298,196 @@ def test_check_parameters_download_only_resolves_yambo5_without_global_repositor
 
     assert resolved["yambo_version"] == "5"
     assert resolved["download_link"] == ""
+
+
+def test_get_yambo_info_reuses_cached_result_until_executable_changes(tmp_path):
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    calls = tmp_path / "calls.txt"
+    yambo = tmp_path / "yambo"
+    yambo.write_text(
+        "#!/usr/bin/env python3\n"
+        "import sys\n"
+        f"open({str(calls)!r}, 'a').write('x')\n"
+        "sys.stderr.write('Version: 5.3.0 revision 123 hash abc\\nConfiguration: MPI\\n')\n"
+    )
+    os.chmod(yambo, 0o755)
+
+    first = get_yambo_info(yambo, cache_dir)
+    second = get_yambo_info(yambo, cache_dir)
+    config_module._cached_yambo_info.cache_clear()
+    persisted = get_yambo_info(yambo, cache_dir)
+
+    assert first == second == persisted
+    assert first["version"] == ["5", "3", "0"]
+    assert calls.read_text() == "x"
+    assert (cache_dir / "yambo_info.json").exists()
+
+    os.utime(yambo, ns=(0, 0))
+    get_yambo_info(yambo, cache_dir)
+
+    assert calls.read_text() == "xx"
+
+
+def test_get_yambo_info_treats_a_truncated_cache_as_a_miss(tmp_path):
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    cache_file = cache_dir / "yambo_info.json"
+    cache_file.write_text('{"/opt/yambo": {"mtime_ns": 1')
+    yambo = tmp_path / "yambo"
+    _write_executable(yambo, stderr_text="Version: 5.3.0 revision 123 hash abc\nConfiguration: MPI\n")
+    config_module._cached_yambo_info.cache_clear()
+
+    info = get_yambo_info(yambo, cache_dir)
+
+    assert info["version"] == ["5", "3", "0"]
+    assert list(json.loads(cache_file.read_text())) == [str(yambo)]
+    assert sorted(path.name for path in cache_dir.iterdir()) == ["yambo_info.json"]
+
+
+def test_check_parameters_resolves_executables_from_a_single_path_scan(monkeypatch, tmp_path):
+    first_bin = tmp_path / "first"
+    second_bin = tmp_path / "second"
+    for directory in (first_bin, second_bin):
+        directory.mkdir()
+    for name in ("tests", "scratch", "cache"):
+        (tmp_path / name).mkdir()
+
+    _write_executable(
+        second_bin / "yambo",
+        stderr_text="Version: 5.3.0 revision 123 hash abc\nConfiguration: MPI\n",
+    )
+    _write_executable(second_bin / "p2y")
+    _write_executable(second_bin / "mpirun")
+    # Not executable: must be skipped in favour of the next PATH entry.
+    (first_bin / "p2y").write_text("")
+    python_bin = os.path.dirname(shutil.which("python3"))
+    monkeypatch.setenv(
+        "PATH",
+        os.pathsep.join([str(first_bin), str(tmp_path / "missing"), str(second_bin), python_bin]),
+    )
+
+    scans = []
+    scan_path = config_module.scan_path
+    monkeypatch.setattr(config_module, "scan_path", lambda: scans.append(1) or scan_path())
+
+    parameters = {
+        "init": False,
+        "donly": False,
+        "cache_dir": tmp_path / "cache",
+        "scratch_dir": tmp_path / "scratch",
+        "tests_dir": tmp_path / "tests",
+        "yambo_bin": "",
+        "mpi_launcher": "mpirun",
+        "nprocs": 2,
+        "thrs": 1,
+        "tollerance": 0.1,
+        "label": "demo",
+    }
+    executables = {"yambo": "yambo", "p2y": "p2y", "ypp": "ypp"}
+
+    resolved = check_parameters(parameters, executables, logging.getLogger("test-config"))
+
+    assert scans == [1]
+    assert resolved["executables"]["yambo"] == second_bin / "yambo"
+    assert resolved["executables"]["p2y"] == second_bin / "p2y"
+    assert resolved["executables"]["ypp"] is None
+    assert resolved["mpi_launcher"] == second_bin / "mpirun"
+
+
+def test_check_parameters_resolves_shared_binaries_once_without_which(monkeypatch, tmp_path):
+    yambo_bin = tmp_path / "bin"
+    yambo_bin.mkdir()
+    for name in ("tests", "scratch", "cache"):
+        (tmp_path / name).mkdir()
+    _write_executable(
+        yambo_bin / "yambo",
+        stderr_text="Version: 5.3.0 revision 123 hash abc\nConfiguration: serial\n",
+    )
+
+    checked = []
+    is_executable = config_module._is_executable
+    monkeypatch.setattr(config_module, "_is_executable", lambda path: checked.append(path) or is_executable(path))
+    monkeypatch.setattr(config_module.shutil, "which", lambda *args: pytest.fail("shutil.which called"))
+
+    parameters = {
+        "init": False,
+        "donly": False,
+        "cache_dir": tmp_path / "cache",
+        "scratch_dir": tmp_path / "scratch",
+        "tests_dir": tmp_path / "tests",
+        "yambo_bin": yambo_bin,
+        "mpi_launcher": None,
+        "nprocs": 2,
+        "thrs": 1,
+        "tollerance": 0.1,
+        "label": "demo",
+    }
+    executables = {"yambo": "yambo", "yambo_ph": "yambo"}
+
+    resolved = check_parameters(parameters, executables, logging.getLogger("test-config"))
+
+    assert resolved["executables"]["yambo"] == yambo_bin / "yambo"
+    assert resolved["executables"]["yambo_ph"] == yambo_bin / "yambo"
+    assert checked == [yambo_bin / "yambo"]
+
+
+def test_check_dir_creates_only_missing_scratch_and_cache_dirs(tmp_path):
+    logger = logging.getLogger("test-config")
+
+    assert config_module.check_dir("tests_dir", tmp_path, logger) == tmp_path.resolve()
+    assert config_module.check_dir("cache_dir", tmp_path / "cache", logger).is_dir()
+
+    with pytest.raises(NotADirectoryError):
+        config_module.check_dir("tests_dir", tmp_path / "missing", logger)
+    (tmp_path / "file").write_text("")
+    with pytest.raises(NotADirectoryError):
+        config_module.check_dir("scratch_dir", tmp_path / "file", logger)
+    with pytest.raises(NotADirectoryError):
+        config_module.check_dir("tests_dir", tmp_path / "file", logger)
+
+
+def test_ensure_dir_creates_missing_parents(tmp_path):
+    created = config_module.ensure_dir("scratch_dir", tmp_path / "a" / "b", logging.getLogger("test-config"))
+
+    assert created == (tmp_path / "a" / "b").resolve()
+    assert created.is_dir()
+
+
+@pytest.mark.parametrize(
+    "par, value, message",
+    [
+        ("nprocs", "2", "nprocs: 2 not an int."),
+        ("thrs", 1.5, "thrs: 1.5 not an int."),
+        ("jobs", 0, "jobs: 0 not a positive int."),
+        ("tollerance", 1, "tollerance: 1 not a float."),
+    ],
+)
+def test_check_parameters_rejects_wrong_numeric_types(tmp_path, par, value, message):
+    yambo_bin = tmp_path / "bin"
+    yambo_bin.mkdir()
+    for name in ("tests", "scratch", "cache"):
+        (tmp_path / name).mkdir()
+    _write_executable(
+        yambo_bin / "yambo",
+        stderr_text="Version: 5.3.0 revision 123 hash abc\nConfiguration: MPI+OpenMP\n",
+    )
+    _write_executable(yambo_bin / "mpirun")
+    parameters = {
+        "init": False,
+        "donly": False,
+        "cache_dir": tmp_path / "cache",
+        "scratch_dir": tmp_path / "scratch",
+        "tests_dir": tmp_path / "tests",
+        "yambo_bin": yambo_bin,
+        "mpi_launcher": str(yambo_bin / "mpirun"),
+        "nprocs": 2,
+        "thrs": 1,
+        "jobs": 1,
+        "tollerance": 0.1,
+        "label": "demo",
+    }
+    parameters[par] = value
+
+    with pytest.raises(TypeError, match=message):
+        check_parameters(parameters, {"yambo": "yambo"}, logging.getLogger("test-config"))
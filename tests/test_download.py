@@ -0,0 +1,80 @@
+import hashlib
+import logging
+
+import pytest
+
+from yambo_tester.download import download_test, fetch, sha256sum, wait_download
+
+
+def _parameters(tmp_path, source_dir):
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    return {
+        "cache_dir": cache_dir,
+        "download_link": source_dir.as_uri(),
+        "verbose": False,
+    }
+
+
+def test_download_test_fetches_missing_tarball_in_background(tmp_path):
+    source_dir = tmp_path / "remote"
+    source_dir.mkdir()
+    (source_dir / "Al_bulk_DFT.tar.gz").write_bytes(b"tarball")
+    parameters = _parameters(tmp_path, source_dir)
+
+    tar_file, download = download_test("Al_bulk", "DFT", parameters, logging.getLogger("test-download"))
+
+    assert wait_download(tar_file, download) == hashlib.sha256(b"tarball").hexdigest()
+    assert tar_file == parameters["cache_dir"] / "Al_bulk_DFT.tar.gz"
+    assert tar_file.read_bytes() == b"tarball"
+    assert not tar_file.with_name("Al_bulk_DFT.tar.gz.part").exists()
+
+
+def test_download_test_skips_cached_tarball(tmp_path):
+    parameters = _parameters(tmp_path, tmp_path / "remote")
+    (parameters["cache_dir"] / "He.tar.gz").write_bytes(b"cached")
+
+    tar_file, download = download_test("He", "He", parameters, logging.getLogger("test-download"))
+
+    assert download is None
+    assert wait_download(tar_file, download) is None
+    assert tar_file.read_bytes() == b"cached"
+
+
+def test_download_test_creates_missing_cache_dir(tmp_path):
+    parameters = _parameters(tmp_path, tmp_path / "remote")
+    parameters["cache_dir"] = tmp_path / "new" / "cache"
+    (tmp_path / "remote").mkdir()
+    (tmp_path / "remote" / "He.tar.gz").write_bytes(b"tarball")
+
+    tar_file, download = download_test("He", "He", parameters, logging.getLogger("test-download"))
+    wait_download(tar_file, download)
+
+    assert tar_file.read_bytes() == b"tarball"
+
+
+def test_failed_download_leaves_no_partial_file(tmp_path):
+    dest = tmp_path / "He.tar.gz"
+
+    with pytest.raises(OSError):
+        fetch((tmp_path / "missing.tar.gz").as_uri(), dest)
+
+    assert not dest.exists()
+    assert not dest.with_name("He.tar.gz.part").exists()
+
+
+def test_wait_download_reports_the_tarball(tmp_path):
+    parameters = _parameters(tmp_path, tmp_path / "remote")
+
+    tar_file, download = download_test("He", "DFT", parameters, logging.getLogger("test-download"))
+
+    with pytest.raises(RuntimeError, match="He_DFT.tar.gz"):
+        wait_download(tar_file, download)
+
+
+def test_sha256sum_matches_hashlib(tmp_path):
+    tar_file = tmp_path / "He.tar.gz"
+    data = bytes(range(256)) * 5000
+    tar_file.write_bytes(data)
+
+    assert sha256sum(tar_file) == hashlib.sha256(data).hexdigest()
@@ -58,6 +58,17 @@ def test_reconfiguring_same_test_logger_does_not_duplicate_lines(tmp_path):
     assert len(logger.handlers) == 1
 
 
+def test_test_logger_creates_its_file_on_first_record(tmp_path):
+    run_dir = tmp_path / "run"
+
+    logger = setup_test_logger(run_dir)
+    assert not (run_dir / "tester.log").exists()
+
+    logger.info("first record")
+    logger.handlers[0].flush()
+    assert "first record" in (run_dir / "tester.log").read_text()
+
+
 def test_cli_logs_setup_and_test_lifecycle(monkeypatch, tmp_path):
     main_log = tmp_path / "main.log"
     run_dir = tmp_path / "scratch" / "TestA" / "Case1"
@@ -98,13 +109,13 @@ def test_cli_logs_setup_and_test_lifecycle(monkeypatch, tmp_path):
         )
         return test_dir, run_dir
 
-    def fake_run_test(test, parameters, logger, verbose=False):
+    def fake_run_test(test, parameters, logger, verbose=False, stop=None):
         local_logger = setup_test_logger(run_dir)
         captured["local_logger"] = local_logger
         local_logger.info("local execution details")
         return local_logger
 
-    def fake_run_pytest(test, local_logger, verbose=False):
+    def fake_run_pytest(test, local_logger, verbose=False, isolated=False, stop=None):
         local_logger.info("local validation details")
         return 0
 
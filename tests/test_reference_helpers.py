@@ -1,17 +1,34 @@
+import os
+
+import netCDF4 as nc
 import numpy as np
 import pytest
 
 from yambo_tester.tests.test_reference import (
     assert_file_contains,
     assert_close_significant,
+    assert_finite_output,
+    compare_database,
     compare_text_output,
+    load_reference_data,
     load_text_output_data,
     normalize_reference,
+    read_database_variables,
+    reference_kind,
+    report_is_complete,
     resolve_output_file,
     assert_stdout_or_log_contains,
     test_reference_ok as reference_test_reference_ok,
     test_runs_ok as reference_test_runs_ok,
 )
+from yambo_tester.reference_compare import (
+    ZERO_DFL,
+    _cached_reference_data,
+    _cached_toml,
+    clear_reference_cache,
+    load_toml,
+    significant_columns_close,
+)
 from yambo_tester.selection import RUNLEVEL_FILTER_RETURNCODE, UNSUPPORTED_VERSION_RETURNCODE
 
 
@@ -61,6 +78,47 @@ def test_significant_comparison_fails_large_values():
         assert_close_significant(out, ref, 0.1, "large-diff")
 
 
+def test_significant_comparison_fails_on_a_single_mismatch():
+    ref = np.linspace(1.0, 2.0, 50)
+    out = ref.copy()
+    out[17] *= 1.5
+
+    with pytest.raises(AssertionError):
+        assert_close_significant(out, ref, 0.1, "one-off")
+
+
+def test_significant_columns_match_allclose_on_significant_values():
+    rng = np.random.default_rng(0)
+    ref = rng.uniform(1.0, 2.0, size=(40, 6))
+    spread = np.array([0.02, 0.05, 0.09, 0.12, 0.15, 0.3])
+    out = ref * (1 + spread * rng.uniform(-1.0, 1.0, size=ref.shape))
+
+    expected = [np.allclose(out[:, col], ref[:, col], rtol=0.1, atol=ZERO_DFL) for col in range(ref.shape[1])]
+
+    assert True in expected and False in expected
+    assert significant_columns_close(out, ref, 0.1).tolist() == expected
+
+
+@pytest.mark.parametrize("value", [np.nan, np.inf, -np.inf, 1e101])
+def test_finite_output_rejects_nan_inf_and_too_large_values(value):
+    with pytest.raises(AssertionError, match="NaN or too large"):
+        assert_finite_output(np.array([1.0, value, 2.0]), "o-bad.qp")
+
+
+@pytest.mark.parametrize("value", [np.nan, np.inf, 1e101])
+def test_significant_comparison_with_label_rejects_non_finite_output(value):
+    ref = np.array([[1.0, 2.0], [3.0, 4.0]])
+    out = ref.copy()
+    out[1, 0] = value
+
+    with pytest.raises(AssertionError, match="o-bad.qp: NaN or too large"):
+        significant_columns_close(out, ref, 0.1, label="o-bad.qp")
+
+
+def test_finite_output_accepts_regular_values():
+    assert_finite_output(np.array([[1.0, -2.0], [1e99, 0.0]]), "o-good.qp")
+
+
 def test_text_output_loader_preserves_one_row_multiple_columns(tmp_path):
     data_file = tmp_path / "o-single-row.qp"
     data_file.write_text("1 10.0 20.0\n")
@@ -70,6 +128,72 @@ def test_text_output_loader_preserves_one_row_multiple_columns(tmp_path):
     assert data.shape == (1, 3)
 
 
+def test_text_output_loader_parses_numeric_outputs_in_one_pass(monkeypatch, tmp_path):
+    data_file = tmp_path / "o-02_QP.qp"
+    data_file.write_text("# E Eo\n1 10.0 20.0\n2 11.0 21.0\n")
+
+    def fail_genfromtxt(*args, **kwargs):
+        raise AssertionError("np.genfromtxt used for a numeric file")
+
+    monkeypatch.setattr(np, "genfromtxt", fail_genfromtxt)
+
+    assert load_text_output_data(data_file).tolist() == [[1.0, 10.0, 20.0], [2.0, 11.0, 21.0]]
+
+
+def test_text_output_loader_reads_overflow_fields_as_nan(tmp_path):
+    data_file = tmp_path / "o-02_QP.qp"
+    data_file.write_text("# E Eo\n1 10.0 20.0\n2 ******** 21.0\n")
+
+    data = load_text_output_data(data_file)
+
+    assert data.shape == (2, 3)
+    assert np.isnan(data[1, 1])
+    assert data[1, 2] == 21.0
+
+
+def test_reference_loader_rejects_non_numeric_fields(tmp_path):
+    ref_file = tmp_path / "o-02_QP.qp"
+    ref_file.write_text("1 10.0\n2 ********\n")
+
+    with pytest.raises(ValueError):
+        load_reference_data(ref_file)
+
+
+def test_text_output_loader_keeps_one_column_as_rows(tmp_path):
+    data_file = tmp_path / "o-02_QP.ndb.QP"
+    data_file.write_text("0.5\n0.0\n0.75\n")
+
+    data = load_text_output_data(data_file)
+
+    assert data.shape == (3, 1)
+
+
+def test_text_output_loader_skips_comment_header(tmp_path):
+    data_file = tmp_path / "o-header.qp"
+    data_file.write_text("#  K-point  Band  Eo\n#\n1 1 -1.5\n1 2 2.5\n")
+
+    data = load_text_output_data(data_file)
+
+    assert data.shape == (2, 3)
+    assert data[1, 2] == 2.5
+
+
+def test_reference_loader_caches_until_the_file_changes(tmp_path):
+    ref_file = tmp_path / "o-cached.qp"
+    ref_file.write_text("1 10.0\n")
+
+    first = load_reference_data(ref_file)
+    second = load_reference_data(ref_file)
+
+    assert first is second
+    assert not first.flags.writeable
+
+    ref_file.write_text("1 10.0\n2 20.0\n")
+    os.utime(ref_file, ns=(0, 0))
+
+    assert load_reference_data(ref_file).shape == (2, 2)
+
+
 def test_compare_text_output_handles_one_row_multiple_columns(tmp_path):
     ref_file = tmp_path / "ref.dat"
     out_file = tmp_path / "out.dat"
@@ -116,6 +240,125 @@ def test_compare_text_output_still_fails_multi_row_difference(tmp_path):
         compare_text_output(out_file, ref_file, "o-multi-row.qp", 0.1, set())
 
 
+def _write_database(path, qp_z, energies):
+    with nc.Dataset(path, "w") as dataset:
+        dataset.createDimension("state", len(qp_z))
+        dataset.createDimension("cmplx", 2)
+        dataset.createDimension("band", len(energies))
+        z = dataset.createVariable("QP_Z", "f4", ("state", "cmplx"))
+        z[:, :] = qp_z
+        e = dataset.createVariable("E", "f8", ("band",))
+        e[:] = energies
+
+
+def test_read_database_variables_returns_flat_plain_arrays(tmp_path):
+    out_file = tmp_path / "ndb.QP"
+    _write_database(out_file, [[0.5, 0.0], [0.75, 0.0]], [1.0, 2.0, 3.0])
+
+    qp_z, energies = read_database_variables(out_file, ["QP_Z", "E"])
+
+    assert not isinstance(qp_z, np.ma.MaskedArray)
+    assert qp_z.dtype == np.float32
+    assert energies.dtype == np.float64
+    assert qp_z.tolist() == [0.5, 0.0, 0.75, 0.0]
+    assert energies.tolist() == [1.0, 2.0, 3.0]
+
+
+def test_read_database_variables_reads_only_the_leading_values(tmp_path):
+    out_file = tmp_path / "ndb.QP"
+    _write_database(out_file, [[0.5, 0.1], [0.75, 0.2], [1.0, 0.3]], [1.0, 2.0, 3.0])
+
+    qp_z, energies = read_database_variables(out_file, ["QP_Z", "E"], 3)
+    short = read_database_variables(out_file, ["E"], 5)[0]
+
+    assert qp_z.tolist() == pytest.approx([0.5, 0.1, 0.75])
+    assert energies.tolist() == [1.0, 2.0, 3.0]
+    assert short.tolist() == [1.0, 2.0, 3.0]
+
+
+def test_compare_database_checks_each_variable_slice(tmp_path):
+    out_file = tmp_path / "ndb.QP"
+    ref_file = tmp_path / "o-02_QP.ndb.QP"
+    _write_database(out_file, [[0.5, 0.0], [0.75, 0.0]], [1.0, 2.0, 3.0, 4.0])
+    ref_file.write_text("0.5\n0.0\n0.75\n0.0\n1.0\n2.0\n3.0\n4.0\n")
+
+    compare_database(out_file, ref_file, ["QP_Z", "E"], "o-02_QP.ndb.QP", 0.1)
+
+    ref_file.write_text("0.5\n0.0\n0.75\n0.0\n1.0\n2.0\n3.0\n5.0\n")
+    with pytest.raises(AssertionError, match="in E!"):
+        compare_database(out_file, ref_file, ["QP_Z", "E"], "o-02_QP.ndb.QP", 0.1)
+
+
+def test_clear_reference_cache_forgets_parsed_files(tmp_path):
+    ref_file = tmp_path / "o-cached.qp"
+    ref_file.write_text("1 10.0\n")
+    load_reference_data(ref_file)
+
+    clear_reference_cache()
+
+    assert _cached_reference_data.cache_info().currsize == 0
+
+
+def test_load_toml_is_cached_until_the_file_changes(tmp_path):
+    results_file = tmp_path / "results.toml"
+    results_file.write_text("tollerance = 0.1\n")
+
+    first = load_toml(results_file)
+    assert load_toml(results_file) is first
+
+    results_file.write_text("tollerance = 0.25\n")
+    assert load_toml(results_file) == {"tollerance": 0.25}
+
+    clear_reference_cache()
+    assert _cached_toml.cache_info().currsize == 0
+
+
+def test_compare_database_reads_reference_through_cache(tmp_path):
+    out_file = tmp_path / "ndb.QP"
+    ref_file = tmp_path / "o-02_QP.ndb.QP"
+    _write_database(out_file, [[0.5, 0.0], [0.75, 0.0]], [1.0, 2.0, 3.0, 4.0])
+    ref_file.write_text("0.5\n0.0\n0.75\n0.0\n1.0\n2.0\n3.0\n4.0\n")
+
+    load_reference_data(ref_file)
+    hits = _cached_reference_data.cache_info().hits
+    compare_database(out_file, ref_file, ["QP_Z", "E"], "o-02_QP.ndb.QP", 0.1)
+
+    assert _cached_reference_data.cache_info().hits == hits + 1
+
+
+def test_compare_text_output_uses_per_column_thresholds(tmp_path):
+    ref_file = tmp_path / "ref.dat"
+    out_file = tmp_path / "out.dat"
+    ref_file.write_text("1 1000.0 0.010\n2 2000.0 0.020\n")
+    out_file.write_text("1 1000.0 0.010\n2 2000.0 0.030\n")
+
+    with pytest.raises(AssertionError, match=r"column\(s\) \[3\]"):
+        compare_text_output(out_file, ref_file, "o-columns.qp", 0.1, set())
+
+
+def test_compare_text_output_requires_near_zero_output_for_zero_reference_columns(tmp_path):
+    ref_file = tmp_path / "ref.dat"
+    out_file = tmp_path / "out.dat"
+    ref_file.write_text("1 1.0 0.0\n2 2.0 0.0\n")
+    out_file.write_text("1 1.0 1e-7\n2 2.0 -1e-7\n")
+
+    compare_text_output(out_file, ref_file, "o-zero.qp", 0.1, set())
+
+    out_file.write_text("1 1.0 0.0\n2 2.0 1e-3\n")
+    with pytest.raises(AssertionError, match=r"column\(s\) \[3\]"):
+        compare_text_output(out_file, ref_file, "o-zero.qp", 0.1, set())
+
+
+def test_compare_database_rejects_short_variables(tmp_path):
+    out_file = tmp_path / "ndb.QP"
+    ref_file = tmp_path / "o-02_QP.ndb.QP"
+    _write_database(out_file, [[0.5, 0.0], [0.75, 0.0]], [1.0, 2.0])
+    ref_file.write_text("0.5\n0.0\n0.75\n0.0\n1.0\n2.0\n3.0\n4.0\n")
+
+    with pytest.raises(AssertionError, match="E has 2 value"):
+        compare_database(out_file, ref_file, ["QP_Z", "E"], "o-02_QP.ndb.QP", 0.1)
+
+
 def test_resolve_output_file_uses_output_directory_for_bare_paths(tmp_path):
     assert resolve_output_file(tmp_path, "02_QP", "o-02_QP.qp", "o-02_QP.qp") == tmp_path / "02_QP" / "o-02_QP.qp"
 
@@ -128,6 +371,32 @@ def test_resolve_output_file_uses_stdout_file(tmp_path):
     assert resolve_output_file(tmp_path, "", "STDOUT", "01_p2y.stdout") == tmp_path / "01_p2y.stdout"
 
 
+def test_resolve_output_file_globs_each_report_directory_once(tmp_path):
+    out_dir = tmp_path / "01_init"
+    out_dir.mkdir()
+    (out_dir / "r-01_init_setup").write_text("")
+    reports = {}
+
+    first = resolve_output_file(tmp_path, "01_init", "r-01_init_setup", "", reports)
+    (out_dir / "r-01_init_setup_02").write_text("")
+    second = resolve_output_file(tmp_path, "01_init", "r-01_init_setup", "", reports)
+
+    assert first == second == out_dir / "r-01_init_setup"
+    assert reports == {"01_init": [str(out_dir / "r-01_init_setup")]}
+
+
+@pytest.mark.parametrize("ref, kind", [
+    ("STDOUT", "stdout"),
+    ("r-01_init_setup", "report"),
+    ("o-02_QP.ndb.QP", "database"),
+    ("o-01_rim.ns.cutoff", "database"),
+    ("o-02_QP.qp", "text"),
+    ("ndb.QP", None),
+])
+def test_reference_kind_selects_the_check(ref, kind):
+    assert reference_kind(ref) == kind
+
+
 def test_stdout_reference_checks_expected_string_from_stdout_without_log(tmp_path):
     stdout_file = tmp_path / "01_p2y.stdout"
     stdout_file.write_text("setup\n== P2Y completed ==\n")
@@ -146,6 +415,9 @@ def test_stdout_reference_checks_expected_string_from_stdout_without_log(tmp_pat
         "odir": "",
         "contains": "== P2Y completed ==",
         "skip": False,
+        "kind": "stdout",
+        "ref_file": tmp_path / "REFERENCE" / "STDOUT",
+        "out_file": stdout_file,
     }))
 
 
@@ -168,6 +440,9 @@ def test_stdout_reference_checks_expected_string_from_log_when_stdout_missing(tm
         "odir": "",
         "contains": "== P2Y completed ==",
         "skip": False,
+        "kind": "stdout",
+        "ref_file": tmp_path / "REFERENCE" / "STDOUT",
+        "out_file": stdout_file,
     }))
 
 
@@ -191,6 +466,9 @@ def test_a2y_stdout_reference_checks_completion_marker_from_log_when_stdout_empt
         "odir": "",
         "contains": marker,
         "skip": False,
+        "kind": "stdout",
+        "ref_file": tmp_path / "REFERENCE" / "STDOUT",
+        "out_file": stdout_file,
     }))
 
 
@@ -213,6 +491,9 @@ def test_stdout_reference_fails_when_string_is_missing_from_both_sources(tmp_pat
             "odir": "",
             "contains": "== P2Y completed ==",
             "skip": False,
+            "kind": "stdout",
+            "ref_file": tmp_path / "REFERENCE" / "STDOUT",
+            "out_file": stdout_file,
         }))
 
 
@@ -233,9 +514,55 @@ def test_report_reference_can_check_expected_string(tmp_path):
         "odir": "01_init",
         "contains": "expected report marker",
         "skip": False,
+        "kind": "report",
+        "ref_file": tmp_path / "REFERENCE" / "r-01_init_setup",
+        "out_file": report,
     }))
 
 
+def _text_reference_item(tmp_path, ref, whitelist):
+    return {
+        "out": [ref],
+        "path": ref,
+        "variables": [],
+        "skip_columns": set(),
+        "whitelist": whitelist,
+        "dir": str(tmp_path),
+        "tol": 0.1,
+        "odir": "",
+        "contains": None,
+        "skip": False,
+        "kind": "text",
+        "ref_file": tmp_path / "REFERENCE" / ref,
+        "out_file": tmp_path / ref,
+    }
+
+
+@pytest.mark.parametrize("whitelist", [False, True])
+def test_text_reference_reports_overflow_fields_as_failed_comparison(tmp_path, whitelist):
+    ref = "o-02_QP.qp"
+    (tmp_path / "REFERENCE").mkdir()
+    (tmp_path / "REFERENCE" / ref).write_text("# E Eo\n1 10.0 20.0\n2 11.0 21.0\n")
+    (tmp_path / ref).write_text("# E Eo\n1 10.0 20.0\n2 ******** 21.0\n")
+
+    expected = pytest.xfail.Exception if whitelist else AssertionError
+    with pytest.raises(expected, match="NaN or too large"):
+        reference_test_reference_ok((ref, _text_reference_item(tmp_path, ref, whitelist)))
+
+
+def test_report_is_complete_detects_game_summary_marker(tmp_path):
+    complete = tmp_path / "r-complete"
+    complete.write_text("setup\nGame Over & Game summary\n")
+    incomplete = tmp_path / "r-incomplete"
+    incomplete.write_text("setup\n")
+    empty = tmp_path / "r-empty"
+    empty.write_text("")
+
+    assert report_is_complete(complete)
+    assert not report_is_complete(incomplete)
+    assert not report_is_complete(empty)
+
+
 def test_file_contains_fails_when_string_is_missing(tmp_path):
     output = tmp_path / "STDOUT"
     output.write_text("different output\n")
@@ -1,10 +1,15 @@
+import hashlib
 import logging
 import os
 import tarfile
 import tomllib
+from concurrent.futures import Future
+
+import pytest
 
 from yambo_tester import runner
-from yambo_tester.runner import build_run_command, command_reference_output, download_workflow_tarball, run_test, setup_rundir, stdout_filename
+from yambo_tester.runner import build_run_command, command_reference_output, download_workflow_tarball, launcher_prefix, run_pytest, run_test, setup_rundir, stdout_filename, write_results
+from yambo_tester.selection import UNSUPPORTED_VERSION_RETURNCODE
 
 
 def test_build_run_command_accepts_p2y_without_input_or_output():
@@ -44,6 +49,35 @@ def test_build_run_command_maps_a2y_input_to_file_flag():
     assert build_run_command(run, parameters) == ["/usr/bin/a2y", "-F", "DB/file.nc"]
 
 
+def test_build_run_command_uses_launcher_prefix_with_step_nprocs():
+    parameters = {
+        "mpi": True,
+        "mpi_launcher": "/usr/bin/mpirun",
+        "nprocs": 2,
+        "executables": {"yambo": "/usr/bin/yambo"},
+    }
+    prefix = launcher_prefix(parameters)
+
+    assert prefix == ["/usr/bin/mpirun"]
+    assert build_run_command({"exe": "yambo", "nprocs": 4}, parameters, prefix) == [
+        "/usr/bin/mpirun", "-np", "4", "/usr/bin/yambo",
+    ]
+    assert build_run_command({"exe": "yambo"}, parameters) == [
+        "/usr/bin/mpirun", "-np", "2", "/usr/bin/yambo",
+    ]
+
+
+def test_build_run_command_appends_flags_to_job_string_only():
+    parameters = {"mpi": False, "mpi_launcher": None, "nprocs": 2, "executables": {"yambo": "/usr/bin/yambo"}}
+
+    assert build_run_command({"exe": "yambo", "output": "02_QP", "flags": "01_SCF"}, parameters) == [
+        "/usr/bin/yambo", "-J", "02_QP,01_SCF", "-C", "02_QP",
+    ]
+    assert build_run_command({"exe": "yambo", "output": "02_QP", "flags": ""}, parameters) == [
+        "/usr/bin/yambo", "-J", "02_QP", "-C", "02_QP",
+    ]
+
+
 def test_run_test_p2y_step_writes_stdout_file_and_uses_input_dir(tmp_path):
     executable = tmp_path / "fake_p2y.py"
     executable.write_text(
@@ -96,6 +130,107 @@ def test_run_test_p2y_step_writes_stdout_file_and_uses_input_dir(tmp_path):
     assert results["01_p2y"]["stdout_file"] == stdout_filename("01_p2y")
 
 
+def test_run_pytest_isolated_validates_in_a_separate_interpreter(tmp_path, capsys):
+    executable = tmp_path / "fake_p2y.py"
+    executable.write_text(
+        "#!/usr/bin/env python3\n"
+        "print('== P2Y completed ==')\n"
+    )
+    os.chmod(executable, 0o755)
+
+    run_dir = tmp_path / "run"
+    run_dir.mkdir()
+    (run_dir / "tests.toml").write_text(
+        "[01_p2y]\n"
+        "exe = \"p2y\"\n"
+        "input_dir = \"Al.save\"\n"
+        "runlevel = \"p2y\"\n"
+        "nprocs = 1\n"
+        "dependencies = []\n"
+        "[01_p2y.reference]\n"
+        "\"STDOUT\" = [\"== P2Y completed ==\"]\n"
+    )
+    parameters = {
+        "yambo_version": "6",
+        "mpi": False,
+        "mpi_launcher": None,
+        "nprocs": 2,
+        "omp": False,
+        "thrs": 1,
+        "tollerance": 0.1,
+        "runlevels": [],
+        "executables": {"p2y": executable},
+    }
+    test = {"name": "Al_bulk", "type": "DFT", "run_dir": run_dir}
+    logger = logging.getLogger("test-runner-isolated")
+    run_test(test, parameters, logger)
+
+    returncode = run_pytest(test, logger, isolated=True)
+
+    assert returncode == 0
+    assert (run_dir / "pytest-report.xml").exists()
+    assert "passed" in capsys.readouterr().out
+
+
+def test_write_results_round_trips_through_tomllib(tmp_path):
+    results = {
+        "tollerance": 0.1,
+        "yambo_version": "6",
+        "01_p2y": {
+            "returncode": 0,
+            "cmd": "/opt/yambo bin/p2y -I Al.save",
+            "stdout": 'line\n"quoted" \\ tab\t \x01 \x7f caf\u00e9',
+            "stderr": None,
+        },
+        "step with space": {"returncode": -9999, "skip": True, "x": 1e-05},
+    }
+    results_file = tmp_path / "results.toml"
+
+    write_results(results_file, results)
+
+    with open(results_file, "rb") as f:
+        loaded = tomllib.load(f)
+    del results["01_p2y"]["stderr"]
+    assert loaded == results
+
+
+def test_run_pytest_disables_the_cache_provider(monkeypatch, tmp_path):
+    calls = []
+
+    class FakePopen:
+        returncode = 0
+
+        def __init__(self, cmd, **kwargs):
+            calls.append(cmd)
+
+        def communicate(self, timeout=None):
+            return "", ""
+
+    monkeypatch.setattr(runner.subprocess, "Popen", FakePopen)
+    test = {"name": "Al_bulk", "type": "DFT", "run_dir": tmp_path}
+
+    run_pytest(test, logging.getLogger("test-runner-cache"), isolated=True)
+
+    args = calls[0]
+    assert args[args.index("-p") + 1] == "no:cacheprovider"
+    assert f"--rundir={tmp_path}" in args
+
+
+def test_run_test_swaps_in_converted_save(tmp_path):
+    run_dir = tmp_path / "run"
+    for name in ("SAVE", "SAVE_converted"):
+        (run_dir / name).mkdir(parents=True)
+        (run_dir / name / "origin").write_text(name)
+    test = {"name": "Al_bulk", "type": "DFT", "run_dir": run_dir, "workflow_config": {}}
+    parameters = {"yambo_version": "6", "tollerance": 0.1, "omp": False, "mpi": False, "mpi_launcher": None}
+
+    run_test(test, parameters, logging.getLogger("test-runner-save"))
+
+    assert (run_dir / "SAVE" / "origin").read_text() == "SAVE_converted"
+    assert (run_dir / "oldSAVE" / "origin").read_text() == "SAVE"
+    assert not (run_dir / "SAVE_converted").exists()
+
+
 def test_command_reference_output_preserves_stdout_only(tmp_path):
     (tmp_path / "l_p2y").write_text("<--->  == P2Y completed ==\n")
 
@@ -254,6 +389,58 @@ def test_setup_rundir_uses_same_resolved_metadata_url(monkeypatch, tmp_path):
     assert captured == [("Al_bulk", "DFT", "https://example.invalid/workflow")]
 
 
+def test_run_test_reuses_workflow_config_parsed_by_setup_rundir(monkeypatch, tmp_path):
+    tests_dir = _write_source_workflow(tmp_path, supported='["5"]')
+    monkeypatch.setattr(runner, "download_test", lambda *args: pytest.fail("download_test should not be called"))
+    parameters = {
+        "tests_dir": tests_dir,
+        "scratch_test": tmp_path / "scratch",
+        "cache_dir": tmp_path,
+        "download_link": "",
+        "yambo_version": "6",
+        "verbose": False,
+        "nochecksum": True,
+        "tollerance": 0.1,
+    }
+    test = {"name": "Al_bulk", "type": "DFT"}
+    logger = logging.getLogger("test-setup-config")
+
+    test["test_dir"], test["run_dir"] = setup_rundir(test, parameters, logger)
+    (test["run_dir"] / "tests.toml").unlink()
+    run_test(test, parameters, logger)
+
+    assert test["workflow_config"]["sha256"] == "unused"
+    with open(test["run_dir"] / "results.toml", "rb") as f:
+        results = tomllib.load(f)
+    assert results["01_p2y"]["returncode"] == UNSUPPORTED_VERSION_RETURNCODE
+
+
+def test_setup_rundir_verifies_downloaded_tarball_without_rereading_it(monkeypatch, tmp_path):
+    tests_dir = _write_source_workflow(tmp_path, tarball_url="https://example.invalid/workflow")
+    tar_file = _write_empty_tarball(tmp_path)
+    digest = hashlib.sha256(tar_file.read_bytes()).hexdigest()
+    config_file = tests_dir / "Al_bulk" / "DFT" / "tests.toml"
+    config_file.write_text(config_file.read_text().replace('sha256 = "unused"', f'sha256 = "{digest}"'))
+    download = Future()
+    download.set_result(digest)
+
+    monkeypatch.setattr(runner, "download_test", lambda *args: (tar_file, download))
+    monkeypatch.setattr(runner, "sha256sum", lambda path: pytest.fail("tarball hashed twice"))
+    parameters = {
+        "tests_dir": tests_dir,
+        "scratch_test": tmp_path / "scratch",
+        "cache_dir": tmp_path,
+        "download_link": "",
+        "yambo_version": "5",
+        "verbose": False,
+        "nochecksum": False,
+    }
+
+    test_dir, run_dir = setup_rundir({"name": "Al_bulk", "type": "DFT"}, parameters, logging.getLogger("test-setup-digest"))
+
+    assert run_dir == test_dir / "DFT"
+
+
 def test_download_workflow_tarball_skips_unsupported_version(monkeypatch, tmp_path):
     tests_dir = _write_source_workflow(tmp_path, supported='["5"]')
 